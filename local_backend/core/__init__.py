@@ -1,5 +1,14 @@
+import os
+
+# Settings module of the lean detector entry point (see detector.py)
+DETECTOR_SETTINGS_MODULE = 'core.settings_detector'
+
 # This will make sure the app is always imported when
 # Django starts so that shared_task will use this app.
-from .celery import app as celery_app
+# The detector skips loading Celery at startup and only imports core.celery
+# when a connected device's info collection is queued; `celery -A core`
+# still finds the app through core.celery.
+if os.environ.get('DJANGO_SETTINGS_MODULE') != DETECTOR_SETTINGS_MODULE:
+    from .celery import app as celery_app
 
-__all__ = ('celery_app',)
+    __all__ = ('celery_app',)
@@ -1,38 +1,428 @@
 import logging
-from typing import Dict, List, Callable, Any
+import itertools
+import sys
+import threading
+import time
+import traceback
+from bisect import bisect_left
+from fnmatch import fnmatchcase
+from typing import Dict, List, Callable, Any, Optional, Union
 
 logger = logging.getLogger(__name__)
 
+# Upper bounds (in seconds) of the subscriber latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+HISTOGRAM_LABELS = tuple(f'<={bound * 1000:g}ms' for bound in LATENCY_BUCKETS) + ('slower',)
+
+# Characters that make a subscribed event type a wildcard pattern
+WILDCARD_CHARS = '*?['
+
+class SubscriberStats:
+    """Call counts, latencies and failures of one subscription"""
+
+    __slots__ = ('calls', 'errors', 'slow_calls', 'skipped', 'total_time', 'max_time', 'histogram',
+                 'consecutive_failures', 'disabled_until', 'last_error', 'last_slow_stack')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.slow_calls = 0
+        # Calls skipped while the circuit breaker was open
+        self.skipped = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        # One counter per LATENCY_BUCKETS bound plus one for slower calls
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.consecutive_failures = 0
+        self.disabled_until = None
+        self.last_error = None
+        self.last_slow_stack = None
+
+    def record(self, elapsed: float) -> None:
+        self.calls += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        self.histogram[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'slow_calls': self.slow_calls,
+            'skipped': self.skipped,
+            'avg_ms': round(self.total_time / self.calls * 1000, 3) if self.calls else None,
+            'max_ms': round(self.max_time * 1000, 3),
+            'histogram': dict(zip(HISTOGRAM_LABELS, self.histogram)),
+            'circuit_open': self.disabled_until is not None,
+            'last_error': self.last_error,
+            'last_slow_stack': self.last_slow_stack,
+        }
+
+class Subscription:
+    """A callback registered for an event type, with its filters and profiling data
+
+    ``event_type`` may be an fnmatch pattern such as ``device_*``. The
+    predicates only match dict payloads such as ``DeviceRecord.to_json()``:
+    ``manufacturer`` must be equal, ``name_prefix`` must start the device name
+    and ``port_prefix`` must cover whole ports of ``port_location`` (``b1_p1``
+    matches ``b1_p1`` and ``b1_p1_p3`` but not ``b1_p12``).
+    """
+
+    __slots__ = ('event_type', 'callback', 'name', 'stats', 'sequence', 'wildcard',
+                 'manufacturer', 'name_prefix', 'port_prefix')
+
+    def __init__(self, event_type: str, callback: Callable, sequence: int = 0,
+                 manufacturer: Optional[str] = None, name_prefix: Optional[str] = None,
+                 port_prefix: Optional[str] = None):
+        self.event_type = event_type
+        self.callback = callback
+        self.name = f"{getattr(callback, '__module__', '?')}.{getattr(callback, '__qualname__', repr(callback))}"
+        self.stats = SubscriberStats()
+        # Subscribe order, kept when subscriptions come from different indexes
+        self.sequence = sequence
+        self.wildcard = any(char in event_type for char in WILDCARD_CHARS)
+        self.manufacturer = manufacturer
+        self.name_prefix = name_prefix
+        self.port_prefix = port_prefix
+
+    @property
+    def filtered(self) -> bool:
+        return self.manufacturer is not None or self.name_prefix is not None or self.port_prefix is not None
+
+    def filters(self) -> Dict[str, str]:
+        return {
+            key: value for key, value in (
+                ('manufacturer', self.manufacturer),
+                ('name_prefix', self.name_prefix),
+                ('port_prefix', self.port_prefix),
+            ) if value is not None
+        }
+
+    def covers(self, event_type: str) -> bool:
+        if self.wildcard:
+            return fnmatchcase(event_type, self.event_type)
+        return event_type == self.event_type
+
+    def matches(self, data: Any) -> bool:
+        """Check the predicates against an event payload"""
+        if not self.filtered:
+            return True
+        if not isinstance(data, dict):
+            return False
+        if self.manufacturer is not None and data.get('manufacturer') != self.manufacturer:
+            return False
+        if self.name_prefix is not None:
+            name = data.get('name')
+            if not isinstance(name, str) or not name.startswith(self.name_prefix):
+                return False
+        if self.port_prefix is not None:
+            port = data.get('port_location')
+            if not isinstance(port, str) or not (
+                    port == self.port_prefix or port.startswith(self.port_prefix + '_')):
+                return False
+        return True
+
+class _Route:
+    """The subscriptions covering one event type, indexed by their predicates
+
+    A filtered subscription is filed under one predicate (manufacturer, then
+    port prefix, then name prefix), so a publish only probes the index with
+    the payload's values and checks the remaining predicates of the few
+    subscriptions it finds.
+    """
+
+    __slots__ = ('unfiltered', 'by_manufacturer', 'by_port_prefix', 'by_name_prefix', 'name_prefix_lengths')
+
+    def __init__(self, subscriptions: List[Subscription]):
+        self.unfiltered: List[Subscription] = []
+        self.by_manufacturer: Dict[str, List[Subscription]] = {}
+        self.by_port_prefix: Dict[str, List[Subscription]] = {}
+        self.by_name_prefix: Dict[str, List[Subscription]] = {}
+        for subscription in sorted(subscriptions, key=lambda s: s.sequence):
+            if subscription.manufacturer is not None:
+                self.by_manufacturer.setdefault(subscription.manufacturer, []).append(subscription)
+            elif subscription.port_prefix is not None:
+                self.by_port_prefix.setdefault(subscription.port_prefix, []).append(subscription)
+            elif subscription.name_prefix is not None:
+                self.by_name_prefix.setdefault(subscription.name_prefix, []).append(subscription)
+            else:
+                self.unfiltered.append(subscription)
+        self.name_prefix_lengths = sorted({len(prefix) for prefix in self.by_name_prefix})
+
+    def match(self, data: Any) -> List[Subscription]:
+        """Return the subscriptions to call for a payload, in subscribe order"""
+        if not (self.by_manufacturer or self.by_port_prefix or self.by_name_prefix) or not isinstance(data, dict):
+            return self.unfiltered
+
+        candidates = []
+        if self.by_manufacturer:
+            candidates.extend(self.by_manufacturer.get(data.get('manufacturer'), ()))
+        port = data.get('port_location')
+        if self.by_port_prefix and isinstance(port, str):
+            # Probe every whole-port prefix: b1, b1_p2, b1_p2_p1, ...
+            end = port.find('_')
+            while end != -1:
+                candidates.extend(self.by_port_prefix.get(port[:end], ()))
+                end = port.find('_', end + 1)
+            candidates.extend(self.by_port_prefix.get(port, ()))
+        name = data.get('name')
+        if self.by_name_prefix and isinstance(name, str):
+            for length in self.name_prefix_lengths:
+                if length > len(name):
+                    break
+                candidates.extend(self.by_name_prefix.get(name[:length], ()))
+        if not candidates:
+            return self.unfiltered
+
+        candidates = [subscription for subscription in candidates if subscription.matches(data)]
+        candidates.extend(self.unfiltered)
+        candidates.sort(key=lambda s: s.sequence)
+        return candidates
+
 class EventSystem:
     """A simple publish/subscribe event system for the application"""
     
-    # Dictionary to store subscribers for each event type
-    _subscribers: Dict[str, List[Callable]] = {}
+    # Dictionary to store subscriptions for each subscribed event type or pattern
+    _subscribers: Dict[str, List[Subscription]] = {}
+    
+    # Published event type -> indexed subscriptions covering it, rebuilt lazily
+    _routes: Dict[str, _Route] = {}
+    _sequence = itertools.count()
+    
+    # Optional EventJournal every published event is recorded in
+    _journal = None
+    
+    # Seconds after which a subscriber call is reported as slow (None disables)
+    slow_handler_threshold: Optional[float] = None
+    
+    # Consecutive failures that detach a subscriber (0 disables the breaker),
+    # and seconds before it is tried again
+    breaker_failures = 0
+    breaker_cooldown = 30.0
+    
+    # Subscriber calls in progress: thread id -> (subscription, start, sampled flag)
+    _active: Dict[int, list] = {}
+    _watchdog: Optional[threading.Thread] = None
+    
+    @classmethod
+    def configure(cls, slow_handler_threshold: Optional[float] = None,
+                  breaker_failures: int = 0, breaker_cooldown: float = 30.0) -> None:
+        """Set the slow-handler threshold and circuit breaker policy"""
+        cls.slow_handler_threshold = slow_handler_threshold
+        cls.breaker_failures = breaker_failures
+        cls.breaker_cooldown = breaker_cooldown
+    
+    @classmethod
+    def attach_journal(cls, journal) -> None:
+        """Record every published event in the given EventJournal (None to detach)"""
+        cls._journal = journal
     
     @classmethod
-    def subscribe(cls, event_type: str, callback: Callable) -> None:
-        """Subscribe to an event type with a callback function"""
+    def subscribe(cls, event_type: str, callback: Callable, manufacturer: Optional[str] = None,
+                  name_prefix: Optional[str] = None, port_prefix: Optional[str] = None) -> Subscription:
+        """Subscribe to an event type with a callback function
+        
+        ``event_type`` may be a wildcard pattern (e.g. ``device_*``), and the
+        callback can be limited to devices of a manufacturer, with a name
+        prefix or on a port_location prefix.
+        """
+        subscription = Subscription(
+            event_type, callback, next(cls._sequence),
+            manufacturer=manufacturer, name_prefix=name_prefix, port_prefix=port_prefix,
+        )
         if event_type not in cls._subscribers:
             cls._subscribers[event_type] = []
-        cls._subscribers[event_type].append(callback)
+        cls._subscribers[event_type].append(subscription)
+        cls._routes = {}
         logger.debug(f"Subscribed to event '{event_type}'")
-        
+        return subscription
+    
+    @classmethod
+    def unsubscribe(cls, event_type: Union[str, Subscription], callback: Optional[Callable] = None) -> None:
+        """Unsubscribe a callback from an event type
+
+        Pass the ``Subscription`` returned by ``subscribe`` to remove exactly
+        that subscription, e.g. when one callback is subscribed with several
+        filters.
+        """
+        if isinstance(event_type, Subscription):
+            target = event_type
+            event_type = target.event_type
+        else:
+            target = None
+        subscriptions = cls._subscribers.get(event_type, [])
+        for subscription in subscriptions:
+            if subscription is target or (target is None and subscription.callback == callback):
+                subscriptions.remove(subscription)
+                cls._routes = {}
+                logger.debug(f"Unsubscribed from event '{event_type}'")
+                break
+    
     @classmethod
-    def unsubscribe(cls, event_type: str, callback: Callable) -> None:
-        """Unsubscribe a callback from an event type"""
-        if event_type in cls._subscribers and callback in cls._subscribers[event_type]:
-            cls._subscribers[event_type].remove(callback)
-            logger.debug(f"Unsubscribed from event '{event_type}'")
+    def subscriber_stats(cls) -> List[Dict[str, Any]]:
+        """Describe every subscription with its call counts, latencies and errors"""
+        return [
+            {
+                'event_type': subscription.event_type,
+                'subscriber': subscription.name,
+                'filters': subscription.filters(),
+                **subscription.stats.as_dict(),
+            }
+            for subscriptions in cls._subscribers.values()
+            for subscription in subscriptions
+        ]
     
     @classmethod
     def publish(cls, event_type: str, data: Any = None) -> None:
         """Publish an event with optional data to all subscribers"""
-        if event_type not in cls._subscribers:
-            return
-            
-        logger.debug(f"Publishing event '{event_type}' with data: {data}")
-        for callback in cls._subscribers[event_type]:
+        journal = cls._journal
+        if journal is not None:
             try:
-                callback(data)
+                journal.append(event_type, data)
             except Exception as e:
-                logger.error(f"Error in event subscriber for '{event_type}': {str(e)}") 
\ No newline at end of file
+                logger.error(f"Error journaling event '{event_type}': {str(e)}")
+        cls._dispatch(event_type, data)
+    
+    @classmethod
+    def replay(cls, target, from_offset: int = 0, event_type: Optional[str] = None) -> int:
+        """Re-deliver journaled events from an offset to one consumer
+        
+        ``target`` is a Subscription returned by ``subscribe``, whose event
+        type and filters apply and whose stats count the calls, or a plain
+        callback. No other subscriber is called, so catching one consumer up
+        doesn't repeat the side effects of the rest. ``event_type`` further
+        limits the replay and may be a pattern.
+        
+        Returns the offset to resume from next time.
+        """
+        journal = cls._journal
+        if journal is None:
+            raise RuntimeError("No event journal attached")
+        if isinstance(target, Subscription):
+            subscription = target
+        else:
+            subscription = Subscription(event_type or '*', target)
+        next_offset = from_offset
+        for offset, journaled_type, data in journal.replay(from_offset):
+            next_offset = offset + 1
+            if event_type is not None and not fnmatchcase(journaled_type, event_type):
+                continue
+            if subscription.covers(journaled_type) and subscription.matches(data):
+                cls._call(subscription, data)
+        return next_offset
+    
+    @classmethod
+    def _dispatch(cls, event_type: str, data: Any) -> None:
+        subscriptions = cls._route(event_type).match(data)
+        if not subscriptions:
+            return
+        
+        logger.debug(f"Publishing event '{event_type}' with data: {data}")
+        for subscription in subscriptions:
+            cls._call(subscription, data)
+    
+    @classmethod
+    def _route(cls, event_type: str) -> _Route:
+        routes = cls._routes
+        route = routes.get(event_type)
+        if route is None:
+            # Routes are replaced rather than mutated on (un)subscribe, so a
+            # dispatch in progress keeps iterating a consistent list
+            route = routes[event_type] = _Route([
+                subscription
+                for subscriptions in cls._subscribers.values()
+                for subscription in subscriptions
+                if subscription.covers(event_type)
+            ])
+        return route
+    
+    @classmethod
+    def _call(cls, subscription: Subscription, data: Any) -> None:
+        stats = subscription.stats
+        if stats.disabled_until is not None:
+            if time.monotonic() < stats.disabled_until:
+                stats.skipped += 1
+                return
+            # Cooldown over, let one call through to probe the subscriber
+            logger.info(f"Retrying subscriber {subscription.name} after circuit breaker cooldown")
+        
+        threshold = cls.slow_handler_threshold
+        thread_id = threading.get_ident()
+        active = [subscription, time.perf_counter(), False]
+        # Subscribers may publish in turn, so remember the outer call
+        outer = cls._active.get(thread_id)
+        if threshold:
+            cls._active[thread_id] = active
+            cls._ensure_watchdog()
+        try:
+            subscription.callback(data)
+        except Exception as e:
+            logger.error(f"Error in event subscriber for '{subscription.event_type}': {str(e)}")
+            cls._record_failure(subscription, e)
+        else:
+            stats.consecutive_failures = 0
+            if stats.disabled_until is not None:
+                stats.disabled_until = None
+                logger.info(f"Subscriber {subscription.name} recovered, circuit breaker closed")
+        finally:
+            elapsed = time.perf_counter() - active[1]
+            if outer is not None:
+                cls._active[thread_id] = outer
+            else:
+                cls._active.pop(thread_id, None)
+            stats.record(elapsed)
+            if threshold and elapsed >= threshold:
+                stats.slow_calls += 1
+                if not active[2]:
+                    logger.warning(
+                        f"Slow event subscriber {subscription.name} took {elapsed * 1000:.1f}ms "
+                        f"for '{subscription.event_type}'"
+                    )
+    
+    @classmethod
+    def _record_failure(cls, subscription: Subscription, error: Exception) -> None:
+        stats = subscription.stats
+        stats.errors += 1
+        stats.consecutive_failures += 1
+        stats.last_error = f"{type(error).__name__}: {error}"
+        if cls.breaker_failures and stats.consecutive_failures >= cls.breaker_failures:
+            stats.disabled_until = time.monotonic() + cls.breaker_cooldown
+            logger.warning(
+                f"Subscriber {subscription.name} failed {stats.consecutive_failures} times in a row, "
+                f"detaching it for {cls.breaker_cooldown:g}s"
+            )
+    
+    @classmethod
+    def _ensure_watchdog(cls) -> None:
+        if cls._watchdog is not None and cls._watchdog.is_alive():
+            return
+        cls._watchdog = threading.Thread(target=cls._watch_slow_handlers, name='event-watchdog', daemon=True)
+        cls._watchdog.start()
+    
+    @classmethod
+    def _watch_slow_handlers(cls) -> None:
+        """Sample the stack of subscriber calls that run past the slow threshold"""
+        while True:
+            threshold = cls.slow_handler_threshold
+            if not threshold:
+                time.sleep(1)
+                continue
+            time.sleep(threshold / 2)
+            now = time.perf_counter()
+            frames = None
+            for thread_id, active in list(cls._active.items()):
+                subscription, start, sampled = active
+                if sampled or now - start < threshold:
+                    continue
+                frames = frames or sys._current_frames()
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                active[2] = True
+                stack = ''.join(traceback.format_stack(frame))
+                subscription.stats.last_slow_stack = stack
+                logger.warning(
+                    f"Event subscriber {subscription.name} still running after {(now - start) * 1000:.0f}ms "
+                    f"for '{subscription.event_type}':\n{stack}"
+                )
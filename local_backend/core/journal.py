@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FILE = 'events.jsonl'
+SNAPSHOT_FILE = 'snapshot.json'
+
+
+class EventJournal:
+    """Append-only, fsync-batched journal of published events
+
+    Every event gets a monotonically increasing offset and is written as one
+    JSON line. Writes reach the OS immediately but are only fsynced every
+    ``fsync_every`` events, or by a timer at most ``fsync_interval`` seconds
+    after the first unsynced one, so a crash can lose at most that window
+    even when no further event arrives. Every ``compact_every`` events the state returned by
+    ``state_provider`` is written to a snapshot and older entries are dropped,
+    keeping the last ``retain`` of them for subscribers replaying from an
+    offset.
+    """
+
+    def __init__(self, directory: str, fsync_every: int = 32, fsync_interval: float = 0.5,
+                 compact_every: int = 1000, retain: int = 1000,
+                 state_provider: Optional[Callable[[], Any]] = None):
+        self.directory = str(directory)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self.retain = retain
+        self.state_provider = state_provider
+
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        # Pending timed sync, armed by the first append after a sync
+        self._sync_timer: Optional[threading.Timer] = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.journal_path = os.path.join(self.directory, JOURNAL_FILE)
+        self.snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+
+        self.snapshot_offset, self._snapshot_state = self._read_snapshot()
+        self.next_offset = self._recover_journal()
+        self._file = open(self.journal_path, 'a', encoding='utf-8')
+
+    def append(self, event_type: str, data: Any = None) -> int:
+        """Record an event and return its offset"""
+        with self._lock:
+            offset = self.next_offset
+            line = json.dumps({'offset': offset, 'type': event_type, 'data': data, 'ts': time.time()},
+                              separators=(',', ':'), default=str)
+            self._file.write(line + '\n')
+            self._file.flush()
+            self.next_offset += 1
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or self.fsync_interval <= 0:
+                self._sync_locked()
+            elif self._sync_timer is None:
+                self._sync_timer = threading.Timer(self.fsync_interval, self._timed_sync)
+                self._sync_timer.daemon = True
+                self._sync_timer.start()
+            compact = (self.state_provider is not None
+                       and self.next_offset - self.snapshot_offset >= self.compact_every)
+        if compact:
+            self.compact(self.state_provider())
+        return offset
+
+    def sync(self) -> None:
+        """Force everything appended so far to disk"""
+        with self._lock:
+            self._sync_locked()
+
+    def _timed_sync(self) -> None:
+        with self._lock:
+            self._sync_timer = None
+            if self._unsynced and not self._file.closed:
+                try:
+                    self._sync_locked()
+                except OSError as e:
+                    logger.error(f"Error syncing event journal {self.journal_path}: {str(e)}")
+
+    def _sync_locked(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def replay(self, from_offset: int = 0) -> Iterator[Tuple[int, str, Any]]:
+        """Yield ``(offset, event_type, data)`` for retained events at or after ``from_offset``
+
+        Events compacted away are skipped; compare ``first_offset()`` with the
+        requested offset to detect that a consumer fell too far behind.
+        """
+        with self._lock:
+            self._file.flush()
+        for entry in self._read_entries():
+            if entry['offset'] >= from_offset:
+                yield entry['offset'], entry['type'], entry['data']
+
+    def first_offset(self) -> int:
+        """Offset of the oldest event still available for replay"""
+        for entry in self._read_entries():
+            return entry['offset']
+        return self.next_offset
+
+    def load(self) -> Tuple[Any, Iterator[Tuple[int, str, Any]]]:
+        """Return the last snapshot state and the events recorded after it"""
+        return self._snapshot_state, self.replay(self.snapshot_offset)
+
+    def compact(self, state: Any) -> None:
+        """Snapshot ``state`` at the current offset and drop older events"""
+        with self._lock:
+            self._sync_locked()
+            offset = self.next_offset
+            self._write_atomic(self.snapshot_path, json.dumps({'offset': offset, 'state': state}, default=str))
+
+            keep_from = offset - self.retain
+            retained = [entry for entry in self._read_entries() if entry['offset'] >= keep_from]
+            self._file.close()
+            self._write_atomic(self.journal_path, ''.join(
+                json.dumps(entry, separators=(',', ':'), default=str) + '\n' for entry in retained
+            ))
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+            self.snapshot_offset = offset
+            self._snapshot_state = state
+        logger.debug(f"Compacted event journal at offset {offset}, kept {len(retained)} events")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._sync_timer is not None:
+                self._sync_timer.cancel()
+                self._sync_timer = None
+            if not self._file.closed:
+                self._sync_locked()
+                self._file.close()
+
+    def _read_snapshot(self) -> Tuple[int, Any]:
+        try:
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+            return snapshot['offset'], snapshot['state']
+        except FileNotFoundError:
+            return 0, None
+        except (ValueError, KeyError) as e:
+            logger.error(f"Ignoring unreadable journal snapshot {self.snapshot_path}: {str(e)}")
+            return 0, None
+
+    def _read_entries(self) -> Iterator[dict]:
+        try:
+            with open(self.journal_path, encoding='utf-8') as f:
+                for line in f:
+                    if line.endswith('\n'):
+                        yield json.loads(line)
+        except FileNotFoundError:
+            return
+
+    def _recover_journal(self) -> int:
+        """Find the next offset, cutting off a line left half-written by a crash"""
+        next_offset = self.snapshot_offset
+        good_bytes = 0
+        try:
+            with open(self.journal_path, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b'\n'):
+                        break
+                    good_bytes += len(line)
+                    next_offset = max(next_offset, entry['offset'] + 1)
+                size = f.seek(0, os.SEEK_END)
+        except FileNotFoundError:
+            return next_offset
+
+        if size != good_bytes:
+            logger.warning(f"Truncating {size - good_bytes} bytes of partial writes from {self.journal_path}")
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(good_bytes)
+        return next_offset
+
+    def _write_atomic(self, path: str, content: str) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
@@ -0,0 +1,83 @@
+import gzip
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.module_loading import import_string
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, gzip is always available
+    brotli = None
+
+# Responses smaller than this aren't worth compressing, in bytes
+DEFAULT_COMPRESSION_MIN_BYTES = 1024
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Callable that maps a request to its tenant id, overridable with TENANT_RESOLVER
+DEFAULT_TENANT_RESOLVER = 'core.tenancy.get_request_tenant'
+
+_accepts_gzip = re.compile(r'\bgzip\b')
+_accepts_brotli = re.compile(r'\bbr\b')
+
+
+class CompressionMiddleware:
+    """Compress large API responses with brotli or gzip
+
+    Only paths under ``API_COMPRESSION_PATH_PREFIX`` are compressed: those
+    carry no CSRF tokens or other secrets next to attacker-controlled input,
+    so compression can't leak them (BREACH).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_bytes = getattr(settings, 'API_COMPRESSION_MIN_BYTES', DEFAULT_COMPRESSION_MIN_BYTES)
+        self.path_prefix = getattr(settings, 'API_COMPRESSION_PATH_PREFIX', '/api/')
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not request.path.startswith(self.path_prefix):
+            return response
+        if response.streaming or response.has_header('Content-Encoding') or len(response.content) < self.min_bytes:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is not None and _accepts_brotli.search(accept_encoding):
+            encoding, compressed = 'br', brotli.compress(response.content, quality=BROTLI_QUALITY)
+        elif _accepts_gzip.search(accept_encoding):
+            encoding, compressed = 'gzip', gzip.compress(response.content, compresslevel=GZIP_LEVEL, mtime=0)
+        else:
+            return response
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # The body differs from the uncompressed one, so a strong ETag no longer applies
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+
+class TenantMiddleware:
+    """Resolve the tenant of every request once and store it as ``request.tenant``
+
+    The default resolver trusts the ``X-Tenant-ID`` header and ``?tenant=``
+    parameter, which any client can set, so it scopes data but does not
+    isolate tenants. Before relying on it for isolation, point
+    ``TENANT_RESOLVER`` at a resolver that derives the tenant from the
+    authenticated ``request.user`` (this middleware runs after authentication).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.resolve_tenant = import_string(getattr(settings, 'TENANT_RESOLVER', DEFAULT_TENANT_RESOLVER))
+
+    def __call__(self, request):
+        request.tenant = self.resolve_tenant(request)
+        return self.get_response(request)
@@ -0,0 +1,146 @@
+import datetime
+import json
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Sequence
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .tenancy import get_tenant_cached
+
+try:
+    import msgpack
+except ImportError:  # MessagePack responses are optional
+    msgpack = None
+
+# Response layouts for list endpoints: rows as objects (the default), rows as
+# arrays under a single list of field names, and the columnar rows in MessagePack
+JSON = 'json'
+COLUMNAR = 'columnar'
+MSGPACK = 'msgpack'
+
+CONTENT_TYPES = {
+    JSON: 'application/json',
+    COLUMNAR: 'application/vnd.columnar+json',
+    MSGPACK: 'application/msgpack',
+}
+
+# Accept header media types of each layout; wildcards are served as JSON
+_MEDIA_TYPE_FORMATS = {
+    **{content_type: layout for layout, content_type in CONTENT_TYPES.items()},
+    'application/x-msgpack': MSGPACK,
+    'application/*': JSON,
+    '*/*': JSON,
+}
+
+# Query parameter that picks a layout, overriding the Accept header
+FORMAT_QUERY_PARAM = 'format'
+
+_fallback_encoder = DjangoJSONEncoder()
+_isoformat = datetime.datetime.isoformat
+
+
+def encode_datetime(value: datetime.datetime) -> str:
+    """Format a datetime exactly like DjangoJSONEncoder, without its type dispatch"""
+    if value.microsecond:
+        text = _isoformat(value, 'T', 'milliseconds')
+    else:
+        text = _isoformat(value)
+    if text.endswith('+00:00'):
+        return text[:-6] + 'Z'
+    return text
+
+
+def available_formats() -> List[str]:
+    return [JSON, COLUMNAR] + ([MSGPACK] if msgpack is not None else [])
+
+
+def _accepted_media_types(accept: str) -> List[tuple]:
+    """Parse an Accept header into ``(q, media_type)`` entries, in header order"""
+    entries = []
+    for part in accept.split(','):
+        media_type, *params = [piece.strip() for piece in part.split(';')]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media_type:
+            entries.append((q, media_type.lower()))
+    return entries
+
+
+def negotiate_format(request) -> str:
+    """Pick the response layout from ``?format=`` or the Accept header
+
+    The acceptable media type with the highest q-value wins (the earliest one
+    on a tie). Unknown or unavailable layouts (MessagePack without the msgpack
+    package) fall back to plain JSON.
+    """
+    requested = request.GET.get(FORMAT_QUERY_PARAM)
+    if requested in CONTENT_TYPES:
+        return requested if requested in available_formats() else JSON
+    formats = available_formats()
+    best = None
+    for q, media_type in _accepted_media_types(request.META.get('HTTP_ACCEPT', '')):
+        layout = _MEDIA_TYPE_FORMATS.get(media_type)
+        if layout is None or layout not in formats or q <= 0:
+            continue
+        if best is None or q > best[0]:
+            best = (q, layout)
+    return best[1] if best is not None else JSON
+
+
+class APIJSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder that checks for datetimes, by far the most common non-JSON type, first"""
+
+    def default(self, o):
+        if type(o) is datetime.datetime:
+            return encode_datetime(o)
+        return super().default(o)
+
+
+def _msgpack_default(value: Any) -> Any:
+    if type(value) is datetime.datetime:
+        return encode_datetime(value)
+    return _fallback_encoder.default(value)
+
+
+def to_columns(rows: Iterable[Dict[str, Any]], fields: Sequence[str]) -> List[tuple]:
+    """Turn row dicts into value tuples in ``fields`` order"""
+    if len(fields) == 1:
+        return [(row[fields[0]],) for row in rows]
+    return list(map(itemgetter(*fields), rows))
+
+
+def encode_rows(key: str, rows: Iterable[Dict[str, Any]], fields: Sequence[str], layout: str = JSON) -> bytes:
+    """Serialize rows as ``{key: [...]}`` in the given layout
+
+    Datetimes are formatted like DjangoJSONEncoder does, so every layout
+    carries the same values.
+    """
+    if layout == JSON:
+        payload = {key: rows if isinstance(rows, list) else list(rows)}
+    else:
+        payload = {'fields': list(fields), key: to_columns(rows, fields)}
+    if layout == MSGPACK:
+        return msgpack.packb(payload, default=_msgpack_default, use_bin_type=True)
+    return json.dumps(payload, cls=APIJSONEncoder, separators=(',', ':')).encode()
+
+
+def list_response(request, tenant_id: str, name: str, key: str, fields: Sequence[str],
+                  builder: Callable[[], Iterable[Dict[str, Any]]]) -> HttpResponse:
+    """Return a tenant's list payload in the negotiated layout
+
+    The encoded body is cached per tenant and layout, so repeated requests
+    skip both the query and the serialization.
+    """
+    layout = negotiate_format(request)
+    body = get_tenant_cached(tenant_id, f'{name}.{layout}', lambda: encode_rows(key, builder(), fields, layout))
+    response = HttpResponse(body, content_type=CONTENT_TYPES[layout])
+    patch_vary_headers(response, ('Accept',))
+    return response
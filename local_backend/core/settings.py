@@ -44,10 +44,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.TenantMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -127,6 +129,62 @@ STATIC_URL = '/static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache used for the per-tenant API payloads
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'device-api',
+    }
+}
+
+# Seconds a cached per-tenant API payload is served for. Saves in this process
+# invalidate it immediately; writes made by Celery workers only become visible
+# once it expires unless CACHES points at a shared backend such as memcached.
+TENANT_CACHE_TIMEOUT = 5
+
+# API responses at least this large are compressed (brotli when the brotli
+# package is installed and the client accepts it, gzip otherwise)
+API_COMPRESSION_MIN_BYTES = 1024
+
+# Dotted path of the callable TenantMiddleware sets request.tenant with
+TENANT_RESOLVER = 'core.tenancy.get_request_tenant'
+
+# Seconds between checks of the device lookup data file (DEVICE_LOOKUPS_PATH,
+# default device_info/data/device_lookups.json); an edited file is reloaded
+# by every running process. 0 disables the check.
+DEVICE_LOOKUPS_RELOAD_SECONDS = 5
+
+# Tenant that devices detected on this station are recorded under
+STATION_TENANT_ID = 'default'
+
+# Seconds a device must stay connected (or disconnected) before an event is
+# published, so loose cables don't produce a stream of connect/disconnect events
+DEVICE_SETTLE_SECONDS = 2
+
+# Apple USB product IDs to detect in addition to the known iPhone/iPad IDs in
+# device_connector.device_detection, e.g. [0x12ac] for a model released later
+DEVICE_EXTRA_PRODUCT_IDS = []
+
+# Where the detector (poll_devices or the Celery polling worker) journals
+# connection events so a restarted detector can restore its state instead of
+# re-announcing every connected device
+DEVICE_EVENT_JOURNAL_DIR = BASE_DIR / 'journal'
+
+# Event subscribers taking longer than this many seconds are logged with a
+# stack sample (None disables the check)
+EVENT_SLOW_HANDLER_SECONDS = 0.5
+
+# Consecutive failures after which a subscriber is detached for
+# EVENT_BREAKER_COOLDOWN seconds (0 keeps failing subscribers attached)
+EVENT_BREAKER_FAILURES = 5
+EVENT_BREAKER_COOLDOWN = 30
+
+# Seconds between exports of the subscriber stats from the process that
+# publishes device events (read by /api/events/subscribers/)
+EVENT_STATS_EXPORT_SECONDS = 5
+
 # Celery Configuration
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
@@ -135,6 +193,17 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Device polling runs on its own queue so collection work can't delay it
+CELERY_TASK_ROUTES = {
+    'device_connector.tasks.*': {'queue': 'device_polling'},
+    'device_info.tasks.*': {'queue': 'device_info'},
+}
+
+# Tasks are short, so workers reserve one at a time instead of hoarding a
+# batch that other workers could have started, and acknowledge on receipt
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_ACKS_LATE = False
+
 # Celery Beat Settings
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
@@ -0,0 +1,18 @@
+"""
+Minimal settings profile for the device detector process.
+
+Only the apps the detector needs are installed: no admin, auth, sessions,
+messages, static files or Celery beat, and no middleware or templates since
+it serves no requests. Used by detector.py.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'device_connector',
+    'device_info',
+]
+
+MIDDLEWARE = []
+
+TEMPLATES = []
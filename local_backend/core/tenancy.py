@@ -0,0 +1,102 @@
+import logging
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from django.db.models.signals import post_delete, post_save
+
+logger = logging.getLogger(__name__)
+
+# Tenant used for rows created before tenancy existed and for requests without one
+DEFAULT_TENANT_ID = 'default'
+
+# Request header and query parameter the tenant is resolved from
+TENANT_HEADER = 'HTTP_X_TENANT_ID'
+TENANT_QUERY_PARAM = 'tenant'
+
+MAX_TENANT_ID_LENGTH = 255
+
+# How long cached per-tenant payloads live unless settings say otherwise, in seconds
+DEFAULT_TENANT_CACHE_TIMEOUT = 300
+
+
+def get_request_tenant(request) -> str:
+    """Resolve the tenant a request is scoped to
+
+    The ``X-Tenant-ID`` header wins over the ``?tenant=`` query parameter; when
+    neither is present the default tenant is used. Both are supplied by the
+    client and unauthenticated. Views read ``request.tenant``, set by
+    ``core.middleware.TenantMiddleware``, rather than calling this directly.
+    """
+    tenant_id = request.META.get(TENANT_HEADER) or request.GET.get(TENANT_QUERY_PARAM)
+    if not tenant_id:
+        return DEFAULT_TENANT_ID
+    return tenant_id.strip()[:MAX_TENANT_ID_LENGTH] or DEFAULT_TENANT_ID
+
+
+def station_tenant_id() -> str:
+    """Return the tenant that devices detected on this station belong to"""
+    return getattr(settings, 'STATION_TENANT_ID', DEFAULT_TENANT_ID)
+
+
+class TenantQuerySet(models.QuerySet):
+    """QuerySet with tenant scoping helpers"""
+
+    def for_tenant(self, tenant_id: str) -> 'TenantQuerySet':
+        return self.filter(tenant_id=tenant_id)
+
+
+TenantManager = models.Manager.from_queryset(TenantQuerySet)
+
+
+def _generation_key(tenant_id: str) -> str:
+    return f"tenant:{tenant_id}:generation"
+
+
+def tenant_cache_key(tenant_id: str, name: str) -> str:
+    """Build a cache key inside the tenant's current namespace
+
+    Every key embeds the tenant's generation number, so bumping the
+    generation invalidates all of the tenant's entries at once without
+    touching other tenants.
+    """
+    generation = cache.get_or_set(_generation_key(tenant_id), 1, timeout=None)
+    return f"tenant:{tenant_id}:g{generation}:{name}"
+
+
+def get_tenant_cached(tenant_id: str, name: str, builder: Callable[[], Any],
+                      timeout: Optional[int] = None) -> Any:
+    """Return a cached per-tenant value, building and storing it on a miss"""
+    if timeout is None:
+        timeout = getattr(settings, 'TENANT_CACHE_TIMEOUT', DEFAULT_TENANT_CACHE_TIMEOUT)
+    key = tenant_cache_key(tenant_id, name)
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, timeout)
+    return value
+
+
+def invalidate_tenant_cache(tenant_id: str) -> None:
+    """Drop every cached entry for a tenant"""
+    try:
+        cache.incr(_generation_key(tenant_id))
+    except ValueError:
+        # No generation stored yet (or it was evicted), so nothing to invalidate
+        cache.set(_generation_key(tenant_id), 1, timeout=None)
+
+
+def _invalidate_instance_tenant(sender, instance, **kwargs):
+    invalidate_tenant_cache(instance.tenant_id)
+
+
+def register_tenant_cache_invalidation(model) -> None:
+    """Invalidate a tenant's cache whenever one of its rows is saved or deleted
+
+    Bulk operations don't send these signals and must call
+    ``invalidate_tenant_cache`` themselves.
+    """
+    uid = f"tenant_cache_{model._meta.label_lower}"
+    post_save.connect(_invalidate_instance_tenant, sender=model, dispatch_uid=f"{uid}_save")
+    post_delete.connect(_invalidate_instance_tenant, sender=model, dispatch_uid=f"{uid}_delete")
@@ -0,0 +1,531 @@
+import datetime
+import gzip
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from device_connector.device_detection import DEVICE_CONNECTED, DEVICE_DISCONNECTED, DeviceDetector
+from device_connector.device_record import DeviceRecord
+
+from . import middleware, serialization
+from .events import EventSystem, Subscription, _Route
+from .journal import EventJournal
+from .middleware import CompressionMiddleware
+from .serialization import COLUMNAR, JSON, MSGPACK, encode_datetime, encode_rows, negotiate_format
+
+
+def device_json(device_id, port_location='b1_p1', name='iPhone', manufacturer='Apple Inc.'):
+    return {'manufacturer': manufacturer, 'name': name, 'device_id': device_id, 'port_location': port_location}
+
+
+class EventJournalTests(SimpleTestCase):
+    """Durability, compaction and recovery of the event journal"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def open(self, **kwargs):
+        journal = EventJournal(self.directory, **kwargs)
+        self.addCleanup(journal.close)
+        return journal
+
+    def test_replay_from_offset(self):
+        journal = self.open()
+        self.assertEqual([journal.append('tick', n) for n in range(3)], [0, 1, 2])
+        self.assertEqual(list(journal.replay(1)), [(1, 'tick', 1), (2, 'tick', 2)])
+
+    def test_half_written_line_is_truncated_on_open(self):
+        journal = self.open()
+        journal.append('tick', 0)
+        journal.append('tick', 1)
+        journal.close()
+        with open(journal.journal_path, 'a', encoding='utf-8') as f:
+            f.write('{"offset":2,"type":"ti')
+        size = os.path.getsize(journal.journal_path)
+
+        with self.assertLogs('core.journal', 'WARNING'):
+            journal = self.open()
+        self.assertLess(os.path.getsize(journal.journal_path), size)
+        self.assertEqual(journal.next_offset, 2)
+        self.assertEqual(journal.append('tick', 2), 2)
+        self.assertEqual([offset for offset, _, _ in journal.replay()], [0, 1, 2])
+
+    def test_compaction_snapshots_state_and_keeps_retained_events(self):
+        journal = self.open(compact_every=5, retain=2, state_provider=lambda: {'ticks': journal.next_offset})
+        for n in range(5):
+            journal.append('tick', n)
+
+        self.assertEqual(journal.snapshot_offset, 5)
+        self.assertEqual(journal.first_offset(), 3)
+        self.assertEqual([offset for offset, _, _ in journal.replay()], [3, 4])
+        state, events = journal.load()
+        self.assertEqual(state, {'ticks': 5})
+        self.assertEqual(list(events), [])
+
+        journal.append('tick', 5)
+        self.assertEqual(list(journal.load()[1]), [(5, 'tick', 5)])
+
+    def test_snapshot_and_offsets_survive_reopen(self):
+        journal = self.open(compact_every=3, retain=1, state_provider=lambda: ['state'])
+        for n in range(4):
+            journal.append('tick', n)
+        journal.close()
+
+        journal = self.open()
+        self.assertEqual(journal.next_offset, 4)
+        state, events = journal.load()
+        self.assertEqual(state, ['state'])
+        self.assertEqual(list(events), [(3, 'tick', 3)])
+
+    def test_unsynced_tail_is_synced_without_further_appends(self):
+        journal = self.open(fsync_every=100, fsync_interval=0.05)
+        with mock.patch('core.journal.os.fsync') as fsync:
+            journal.append('tick', 0)
+            journal.append('tick', 1)
+            self.assertEqual(fsync.call_count, 0)
+            deadline = time.monotonic() + 2
+            while not fsync.called and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(fsync.call_count, 1)
+        self.assertEqual(journal._unsynced, 0)
+
+    def test_fsync_every_syncs_immediately(self):
+        journal = self.open(fsync_every=2, fsync_interval=60)
+        with mock.patch('core.journal.os.fsync') as fsync:
+            journal.append('tick', 0)
+            self.assertEqual(fsync.call_count, 0)
+            journal.append('tick', 1)
+            self.assertEqual(fsync.call_count, 1)
+
+
+class DetectorRestoreTests(SimpleTestCase):
+    """Restoring the detector from the journal after a restart"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.addCleanup(self.reset_detector)
+        self.reset_detector()
+
+    def reset_detector(self):
+        DeviceDetector.state.reset()
+        DeviceDetector.connected_devices = DeviceDetector.state.current.devices
+        DeviceDetector.debouncer.reset()
+
+    def test_restores_connected_devices_from_snapshot_and_events(self):
+        journal = EventJournal(self.directory)
+        journal.compact({'a': device_json('a'), 'b': device_json('b', 'b1_p2')})
+        journal.append(DEVICE_DISCONNECTED, device_json('a'))
+        journal.append(DEVICE_CONNECTED, device_json('c', 'b2_p1'))
+        journal.close()
+
+        journal = EventJournal(self.directory)
+        self.addCleanup(journal.close)
+        restored = DeviceDetector.restore_from_journal(journal)
+
+        self.assertEqual(sorted(record.device_id for record in restored), ['b', 'c'])
+        self.assertEqual(sorted(DeviceDetector.get_snapshot().devices), ['b', 'c'])
+        self.assertEqual(sorted(DeviceDetector.debouncer.announced()), ['b', 'c'])
+        self.assertEqual(journal.state_provider(), {'b': device_json('b', 'b1_p2'), 'c': device_json('c', 'b2_p1')})
+
+    def test_restored_devices_are_not_announced_again(self):
+        journal = EventJournal(self.directory)
+        journal.append(DEVICE_CONNECTED, device_json('a'))
+        journal.append(DEVICE_CONNECTED, device_json('b', 'b1_p2'))
+        journal.close()
+
+        journal = EventJournal(self.directory)
+        self.addCleanup(journal.close)
+        DeviceDetector.restore_from_journal(journal)
+        devices = {
+            'a': DeviceRecord.from_json(device_json('a')),
+            'c': DeviceRecord.from_json(device_json('c', 'b2_p1')),
+        }
+        debouncer = DeviceDetector.debouncer
+        debouncer.update(devices, now=0.0)
+        connected, disconnected = debouncer.update(devices, now=debouncer.settle_time)
+
+        # Only the device that arrived and the one that left while the detector was down
+        self.assertEqual([record.device_id for record in connected], ['c'])
+        self.assertEqual([record.device_id for record in disconnected], ['b'])
+
+
+class EventReplayTests(SimpleTestCase):
+    """Catching a single consumer up from the journal"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.journal = EventJournal(directory.name)
+        self.addCleanup(self.journal.close)
+        self.journal.append(DEVICE_CONNECTED, device_json('a', name='iPad'))
+        self.journal.append(DEVICE_CONNECTED, device_json('b'))
+        self.journal.append(DEVICE_DISCONNECTED, device_json('a', name='iPad'))
+        EventSystem.attach_journal(self.journal)
+        self.addCleanup(EventSystem.attach_journal, None)
+
+    def subscribe(self, event_type, callback, **filters):
+        subscription = EventSystem.subscribe(event_type, callback, **filters)
+        self.addCleanup(EventSystem.unsubscribe, subscription)
+        return subscription
+
+    def test_replays_to_subscription_only(self):
+        received, others = [], []
+        subscription = self.subscribe('device_*', received.append)
+        self.subscribe('device_*', others.append)
+
+        self.assertEqual(EventSystem.replay(subscription, from_offset=1), 3)
+        self.assertEqual([data['device_id'] for data in received], ['b', 'a'])
+        self.assertEqual(others, [])
+        self.assertEqual(subscription.stats.calls, 2)
+
+    def test_replay_applies_subscription_filters(self):
+        received = []
+        subscription = self.subscribe(DEVICE_CONNECTED, received.append, name_prefix='iPad')
+        EventSystem.replay(subscription)
+        self.assertEqual(received, [device_json('a', name='iPad')])
+
+    def test_replays_to_callback_with_event_type(self):
+        received = []
+        self.assertEqual(EventSystem.replay(received.append, event_type=DEVICE_DISCONNECTED), 3)
+        self.assertEqual(received, [device_json('a', name='iPad')])
+
+    def test_requires_attached_journal(self):
+        EventSystem.attach_journal(None)
+        with self.assertRaises(RuntimeError):
+            EventSystem.replay(lambda data: None)
+
+
+class RouteTests(SimpleTestCase):
+    """Matching payloads against the predicate indexes of a route"""
+
+    def route(self, *filters):
+        subscriptions = [
+            Subscription('device_connected', lambda data: None, sequence, **kwargs)
+            for sequence, kwargs in enumerate(filters)
+        ]
+        return _Route(subscriptions), subscriptions
+
+    def test_matches_keep_subscribe_order_across_indexes(self):
+        route, subscriptions = self.route(
+            {'name_prefix': 'iPh'}, {}, {'port_prefix': 'b1'}, {'manufacturer': 'Apple Inc.'}, {},
+        )
+        self.assertEqual(route.match(device_json('a')), subscriptions)
+
+    def test_port_prefix_matches_whole_ports(self):
+        route, (port, _) = self.route({'port_prefix': 'b1_p1'}, {'port_prefix': 'b1_p12'})
+        self.assertEqual(route.match(device_json('a', 'b1_p1')), [port])
+        self.assertEqual(route.match(device_json('a', 'b1_p1_p3')), [port])
+        self.assertNotIn(port, route.match(device_json('a', 'b1_p12')))
+        self.assertEqual(route.match(device_json('a', 'b1_p2')), [])
+
+    def test_name_prefix(self):
+        route, (ipad, ipad_pro) = self.route({'name_prefix': 'iPad'}, {'name_prefix': 'iPad Pro'})
+        self.assertEqual(route.match(device_json('a', name='iPad Pro 11')), [ipad, ipad_pro])
+        self.assertEqual(route.match(device_json('a', name='iPad Air')), [ipad])
+        self.assertEqual(route.match(device_json('a', name='iP')), [])
+
+    def test_remaining_predicates_are_checked(self):
+        route, (apple_ipad, _) = self.route({'manufacturer': 'Apple Inc.', 'name_prefix': 'iPad'}, {})
+        self.assertNotIn(apple_ipad, route.match(device_json('a', name='iPhone')))
+        self.assertIn(apple_ipad, route.match(device_json('a', name='iPad')))
+        self.assertNotIn(apple_ipad, route.match(device_json('a', name='iPad', manufacturer='Other')))
+
+    def test_non_dict_payloads_only_reach_unfiltered_subscriptions(self):
+        route, (_, unfiltered) = self.route({'manufacturer': 'Apple Inc.'}, {})
+        for payload in (None, 'b1_p1', ['Apple Inc.']):
+            self.assertEqual(route.match(payload), [unfiltered])
+
+    def test_missing_or_non_string_fields_are_skipped(self):
+        route, (_, _, unfiltered) = self.route({'port_prefix': 'b1'}, {'name_prefix': 'iPad'}, {})
+        self.assertEqual(route.match({'port_location': 1, 'name': None}), [unfiltered])
+
+
+class EventSystemSubscriptionTests(SimpleTestCase):
+    """Subscribing, unsubscribing and dispatching through EventSystem"""
+
+    def subscribe(self, event_type, callback, **filters):
+        subscription = EventSystem.subscribe(event_type, callback, **filters)
+        self.addCleanup(EventSystem.unsubscribe, subscription)
+        return subscription
+
+    def test_wildcard_subscription_covers_matching_types(self):
+        received = []
+        self.subscribe('test_*', lambda data: received.append(('wildcard', data)))
+        self.subscribe('test_event', lambda data: received.append(('exact', data)))
+        EventSystem.publish('test_event', 1)
+        EventSystem.publish('test_other', 2)
+        EventSystem.publish('other_event', 3)
+        self.assertEqual(received, [('wildcard', 1), ('exact', 1), ('wildcard', 2)])
+
+    def test_unsubscribe_removes_the_given_subscription(self):
+        received = []
+        ipad = self.subscribe('test_event', received.append, name_prefix='iPad')
+        self.subscribe('test_event', received.append, name_prefix='iPhone')
+        EventSystem.unsubscribe(ipad)
+        EventSystem.publish('test_event', device_json('a', name='iPad'))
+        EventSystem.publish('test_event', device_json('b', name='iPhone'))
+        self.assertEqual([data['device_id'] for data in received], ['b'])
+
+    def test_unsubscribe_by_callback(self):
+        received = []
+        EventSystem.subscribe('test_event', received.append)
+        EventSystem.unsubscribe('test_event', received.append)
+        EventSystem.publish('test_event', 1)
+        self.assertEqual(received, [])
+
+
+
+class SubscriberProfilingTests(SimpleTestCase):
+    """Latency histogram, slow handler sampling and circuit breaker of subscribers"""
+
+    def setUp(self):
+        for name, value in (('breaker_failures', 3), ('breaker_cooldown', 0.05), ('slow_handler_threshold', None)):
+            patcher = mock.patch.object(EventSystem, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.failing = True
+        self.calls = 0
+
+    def handler(self, data):
+        self.calls += 1
+        if self.failing:
+            raise RuntimeError('device query failed')
+
+    def subscribe(self, callback):
+        subscription = EventSystem.subscribe('test_event', callback)
+        self.addCleanup(EventSystem.unsubscribe, subscription)
+        return subscription
+
+    def publish(self, times=1):
+        for _ in range(times):
+            EventSystem.publish('test_event', {'device_id': 'a'})
+
+    def test_breaker_opens_after_consecutive_failures(self):
+        stats = self.subscribe(self.handler).stats
+        with self.assertLogs('core.events', 'ERROR'):
+            self.publish(2)
+        self.assertIsNone(stats.disabled_until)
+
+        with self.assertLogs('core.events', 'WARNING') as logs:
+            self.publish()
+        self.assertTrue(any('detaching it' in line for line in logs.output))
+        self.assertTrue(stats.as_dict()['circuit_open'])
+        self.assertEqual(stats.last_error, 'RuntimeError: device query failed')
+
+        self.publish(2)
+        self.assertEqual((self.calls, stats.errors, stats.skipped), (3, 3, 2))
+
+    def test_half_open_retry_after_cooldown(self):
+        stats = self.subscribe(self.handler).stats
+        with self.assertLogs('core.events', 'ERROR'):
+            self.publish(3)
+        time.sleep(EventSystem.breaker_cooldown)
+
+        # A failed probe opens the breaker again straight away
+        with self.assertLogs('core.events', 'WARNING'):
+            self.publish()
+        self.assertEqual(self.calls, 4)
+        self.assertIsNotNone(stats.disabled_until)
+        self.publish()
+        self.assertEqual(self.calls, 4)
+
+        time.sleep(EventSystem.breaker_cooldown)
+        self.failing = False
+        with self.assertLogs('core.events', 'INFO'):
+            self.publish()
+        self.assertEqual(self.calls, 5)
+        self.assertIsNone(stats.disabled_until)
+        self.assertEqual(stats.consecutive_failures, 0)
+
+    def test_success_resets_the_failure_count(self):
+        stats = self.subscribe(self.handler).stats
+        with self.assertLogs('core.events', 'ERROR'):
+            self.publish(2)
+        self.failing = False
+        self.publish()
+        self.assertEqual(stats.consecutive_failures, 0)
+        self.failing = True
+        with self.assertLogs('core.events', 'ERROR'):
+            self.publish(2)
+        self.assertIsNone(stats.disabled_until)
+        self.assertEqual(stats.errors, 4)
+
+    def test_breaker_disabled(self):
+        EventSystem.breaker_failures = 0
+        stats = self.subscribe(self.handler).stats
+        with self.assertLogs('core.events', 'ERROR'):
+            self.publish(5)
+        self.assertEqual((self.calls, stats.skipped), (5, 0))
+        self.assertIsNone(stats.disabled_until)
+
+    def test_slow_handler_is_counted_and_its_stack_sampled(self):
+        EventSystem.slow_handler_threshold = 0.05
+
+        def slow_handler(data):
+            time.sleep(0.3)
+
+        slow = self.subscribe(slow_handler).stats
+        fast = self.subscribe(lambda data: None).stats
+        with self.assertLogs('core.events', 'WARNING') as logs:
+            self.publish()
+
+        self.assertEqual((slow.calls, slow.slow_calls), (1, 1))
+        self.assertIn('slow_handler', slow.last_slow_stack)
+        self.assertTrue(any('still running' in line for line in logs.output))
+        self.assertEqual(slow.as_dict()['histogram']['<=500ms'], 1)
+        self.assertEqual((fast.calls, fast.slow_calls, fast.last_slow_stack), (1, 0, None))
+        self.assertEqual(fast.as_dict()['histogram']['<=1ms'], 1)
+
+    def test_histogram_buckets(self):
+        stats = self.subscribe(lambda data: None).stats
+        for elapsed in (0.0005, 0.001, 0.003, 0.2, 7.0):
+            stats.record(elapsed)
+        histogram = stats.as_dict()['histogram']
+        self.assertEqual(histogram['<=1ms'], 2)
+        self.assertEqual(histogram['<=5ms'], 1)
+        self.assertEqual(histogram['<=500ms'], 1)
+        self.assertEqual(histogram['slower'], 1)
+        self.assertEqual(stats.as_dict()['max_ms'], 7000.0)
+
+class NegotiateFormatTests(SimpleTestCase):
+    """Picking the list layout from ?format= and the Accept header"""
+
+    def negotiate(self, accept=None, **params):
+        extra = {'HTTP_ACCEPT': accept} if accept is not None else {}
+        return negotiate_format(RequestFactory().get('/api/devices/', params, **extra))
+
+    def test_defaults_to_json(self):
+        self.assertEqual(self.negotiate(), JSON)
+        self.assertEqual(self.negotiate('text/html,application/xhtml+xml,*/*;q=0.8'), JSON)
+        self.assertEqual(self.negotiate('application/xml'), JSON)
+
+    def test_accept_header(self):
+        self.assertEqual(self.negotiate('application/vnd.columnar+json'), COLUMNAR)
+        self.assertEqual(self.negotiate('application/json, application/vnd.columnar+json'), JSON)
+
+    def test_highest_q_value_wins(self):
+        self.assertEqual(self.negotiate('application/json;q=0.5, application/vnd.columnar+json'), COLUMNAR)
+        self.assertEqual(self.negotiate('application/vnd.columnar+json;q=0.2, application/json'), JSON)
+        self.assertEqual(self.negotiate('application/vnd.columnar+json; q=0.9, */*;q=0.1'), COLUMNAR)
+        self.assertEqual(self.negotiate('application/vnd.columnar+json;q=0'), JSON)
+        self.assertEqual(self.negotiate('application/vnd.columnar+json;q=oops'), JSON)
+
+    def test_query_parameter_overrides_accept(self):
+        self.assertEqual(self.negotiate('application/json', format='columnar'), COLUMNAR)
+        self.assertEqual(self.negotiate('application/vnd.columnar+json', format='json'), JSON)
+        self.assertEqual(self.negotiate(format='xml'), JSON)
+
+    @unittest.skipIf(serialization.msgpack is None, 'msgpack is not installed')
+    def test_msgpack(self):
+        self.assertEqual(self.negotiate('application/msgpack'), MSGPACK)
+        self.assertEqual(self.negotiate('application/x-msgpack'), MSGPACK)
+        self.assertEqual(self.negotiate(format='msgpack'), MSGPACK)
+
+    def test_msgpack_without_the_package_falls_back_to_json(self):
+        with mock.patch.object(serialization, 'msgpack', None):
+            self.assertEqual(self.negotiate('application/msgpack'), JSON)
+            self.assertEqual(self.negotiate(format='msgpack'), JSON)
+
+
+class EncodingTests(SimpleTestCase):
+    """Every layout carries the same values as DjangoJSONEncoder output"""
+
+    rows = [
+        {'id': 1, 'name': 'iPhone', 'last_seen': datetime.datetime(2026, 10, 19, 17, 15, 3, tzinfo=datetime.timezone.utc)},
+        {'id': 2, 'name': None, 'last_seen': datetime.datetime(2026, 10, 19, 17, 15, 3, 456789)},
+    ]
+    fields = ('id', 'name', 'last_seen')
+
+    def test_encode_datetime_matches_django(self):
+        encoder = DjangoJSONEncoder()
+        values = [
+            datetime.datetime(2026, 10, 19, 17, 15, 3, tzinfo=datetime.timezone.utc),
+            datetime.datetime(2026, 10, 19, 17, 15, 3, 456789, tzinfo=datetime.timezone.utc),
+            datetime.datetime(2026, 10, 19, 17, 15, 3, 999, tzinfo=datetime.timezone(datetime.timedelta(hours=2))),
+            datetime.datetime(2026, 10, 19, 17, 15, 3),
+            datetime.datetime(2026, 10, 19, 17, 15, 3, 1),
+        ]
+        for value in values:
+            with self.subTest(value=value):
+                self.assertEqual(encode_datetime(value), encoder.default(value))
+
+    def expected_rows(self):
+        return json.loads(json.dumps(self.rows, cls=DjangoJSONEncoder))
+
+    def test_columnar_rebuilds_json_rows(self):
+        payload = json.loads(encode_rows('devices', self.rows, self.fields, COLUMNAR))
+        rebuilt = [dict(zip(payload['fields'], row)) for row in payload['devices']]
+        self.assertEqual(rebuilt, self.expected_rows())
+        self.assertEqual(json.loads(encode_rows('devices', self.rows, self.fields, JSON))['devices'], self.expected_rows())
+
+    @unittest.skipIf(serialization.msgpack is None, 'msgpack is not installed')
+    def test_msgpack_rebuilds_json_rows(self):
+        payload = serialization.msgpack.unpackb(encode_rows('devices', self.rows, self.fields, MSGPACK), raw=False)
+        rebuilt = [dict(zip(payload['fields'], row)) for row in payload['devices']]
+        self.assertEqual(rebuilt, self.expected_rows())
+
+    def test_single_field(self):
+        payload = json.loads(encode_rows('devices', self.rows, ('id',), COLUMNAR))
+        self.assertEqual(payload, {'fields': ['id'], 'devices': [[1], [2]]})
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    """Compressing API responses"""
+
+    body = json.dumps({'devices': [{'id': n, 'name': 'iPhone', 'port_location': 'b1_p1'} for n in range(100)]}).encode()
+
+    def respond(self, accept_encoding='', path='/api/devices/', body=None, **headers):
+        def get_response(request):
+            response = HttpResponse(self.body if body is None else body, content_type='application/json')
+            for name, value in headers.items():
+                response[name] = value
+            return response
+
+        request = RequestFactory().get(path, HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(get_response)(request)
+
+    @unittest.skipIf(middleware.brotli is None, 'brotli is not installed')
+    def test_prefers_brotli(self):
+        response = self.respond('gzip, deflate, br', ETag='"abc"')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(middleware.brotli.decompress(response.content), self.body)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['ETag'], 'W/"abc"')
+
+    def test_gzip(self):
+        with mock.patch.object(middleware, 'brotli', None):
+            response = self.respond('gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_no_accepted_encoding_still_varies(self):
+        response = self.respond('identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, self.body)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_skips_small_encoded_and_non_api_responses(self):
+        small = self.respond('gzip', body=b'{"devices":[]}')
+        self.assertEqual(small.content, b'{"devices":[]}')
+        self.assertFalse(small.has_header('Content-Encoding'))
+
+        encoded = self.respond('gzip', **{'Content-Encoding': 'identity'})
+        self.assertEqual(encoded['Content-Encoding'], 'identity')
+        self.assertEqual(encoded.content, self.body)
+
+        page = self.respond('gzip', path='/admin/')
+        self.assertEqual(page.content, self.body)
+        self.assertFalse(page.has_header('Content-Encoding'))
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+"""Lean entry point for the device detector.
+
+Runs the poll_devices command with the minimal core.settings_detector
+profile, e.g. ``python detector.py --interval 1 --shards 2``.
+"""
+import os
+import sys
+
+
+def main():
+    """Start device polling with the detector settings profile."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings_detector')
+    try:
+        from django.core.management import execute_from_command_line
+    except ImportError as exc:
+        raise ImportError(
+            "Couldn't import Django. Are you sure it's installed and "
+            "available on your PYTHONPATH environment variable? Did you "
+            "forget to activate a virtual environment?"
+        ) from exc
+    execute_from_command_line([sys.argv[0], 'poll_devices', *sys.argv[1:]])
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,7 @@ from .models import Device
 
 @admin.register(Device)
 class DeviceAdmin(admin.ModelAdmin):
-    list_display = ('manufacturer', 'name', 'port_location', 'is_connected', 'last_seen')
-    list_filter = ('manufacturer', 'is_connected')
+    list_display = ('tenant_id', 'manufacturer', 'name', 'port_location', 'is_connected', 'last_seen')
+    list_filter = ('tenant_id', 'manufacturer', 'is_connected')
     search_fields = ('manufacturer', 'name', 'port_location', 'device_id')
     readonly_fields = ('device_id', 'first_connected', 'last_seen')
@@ -4,3 +4,24 @@ from django.apps import AppConfig
 class DeviceConnectorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'device_connector'
+
+    def ready(self):
+        """Configure the detector and event system, and keep the Device table and per-tenant caches in sync"""
+        from django.conf import settings
+        from core.events import EventSystem
+        from core.tenancy import register_tenant_cache_invalidation
+        from .debounce import DEFAULT_SETTLE_TIME
+        from .device_detection import DeviceDetector
+        from .registry import DeviceRegistry
+        
+        DeviceDetector.debouncer.settle_time = getattr(settings, 'DEVICE_SETTLE_SECONDS', DEFAULT_SETTLE_TIME)
+        DeviceDetector.configure_product_ids(getattr(settings, 'DEVICE_EXTRA_PRODUCT_IDS', ()))
+        EventSystem.configure(
+            slow_handler_threshold=getattr(settings, 'EVENT_SLOW_HANDLER_SECONDS', None),
+            breaker_failures=getattr(settings, 'EVENT_BREAKER_FAILURES', 0),
+            breaker_cooldown=getattr(settings, 'EVENT_BREAKER_COOLDOWN', 30.0),
+        )
+        register_tenant_cache_invalidation(self.get_model('Device'))
+        
+        # Record connections in the Device table before other subscribers run
+        DeviceRegistry.initialize()
@@ -0,0 +1,118 @@
+import logging
+import time
+from collections import Counter
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from .device_record import DeviceRecord
+
+logger = logging.getLogger(__name__)
+
+# Per-device connection states
+PENDING = 'pending'
+CONNECTED = 'connected'
+PENDING_DISCONNECT = 'pending_disconnect'
+GONE = 'gone'
+
+# Seconds a device must stay present (or absent) before the change is reported
+DEFAULT_SETTLE_TIME = 2.0
+
+
+class _TrackedDevice:
+    __slots__ = ('state', 'since', 'record')
+
+    def __init__(self, state: str, since: float, record: DeviceRecord):
+        self.state = state
+        self.since = since
+        self.record = record
+
+
+class DeviceDebouncer:
+    """Hysteresis between raw scan results and connection events
+
+    Each device moves through pending -> connected -> pending_disconnect ->
+    gone, and only the transitions into connected and gone are reported. A
+    device that disappears while pending, or comes back while pending a
+    disconnect, is counted as a suppressed flap for its port instead.
+    """
+
+    def __init__(self, settle_time: float = DEFAULT_SETTLE_TIME, clock=time.monotonic):
+        self.settle_time = settle_time
+        self.clock = clock
+        self._devices: Dict[str, _TrackedDevice] = {}
+        self._pending = 0
+        self._last_devices: Optional[Mapping[str, DeviceRecord]] = None
+        self.suppressed_flaps: Counter = Counter()
+
+    def update(self, devices: Mapping[str, DeviceRecord],
+               now: Optional[float] = None) -> Tuple[List[DeviceRecord], List[DeviceRecord]]:
+        """Feed the latest scan and return the ``(connected, disconnected)`` records to report"""
+        if devices is self._last_devices and not self._pending:
+            # Same snapshot and nothing waiting to settle
+            return [], []
+        self._last_devices = devices
+        now = self.clock() if now is None else now
+        connected, disconnected = [], []
+
+        for device_id, record in devices.items():
+            tracked = self._devices.get(device_id)
+            if tracked is None:
+                tracked = self._devices[device_id] = _TrackedDevice(PENDING, now, record)
+                self._pending += 1
+            elif tracked.state == PENDING_DISCONNECT:
+                tracked.state = CONNECTED
+                self._pending -= 1
+                self._suppress(tracked.record, 'reappeared before disconnect settled')
+            tracked.record = record
+
+            if tracked.state == PENDING and now - tracked.since >= self.settle_time:
+                tracked.state = CONNECTED
+                self._pending -= 1
+                connected.append(record)
+
+        for device_id, tracked in list(self._devices.items()):
+            if device_id in devices:
+                continue
+            if tracked.state == PENDING:
+                del self._devices[device_id]
+                self._pending -= 1
+                self._suppress(tracked.record, 'disappeared before connect settled')
+                continue
+            if tracked.state == CONNECTED:
+                tracked.state = PENDING_DISCONNECT
+                tracked.since = now
+                self._pending += 1
+            if now - tracked.since >= self.settle_time:
+                tracked.state = GONE
+                del self._devices[device_id]
+                self._pending -= 1
+                disconnected.append(tracked.record)
+
+        return connected, disconnected
+
+    def seed(self, devices: Mapping[str, DeviceRecord], now: Optional[float] = None) -> None:
+        """Mark devices as already connected without reporting them"""
+        now = self.clock() if now is None else now
+        for device_id, record in devices.items():
+            self._devices[device_id] = _TrackedDevice(CONNECTED, now, record)
+
+    def announced(self) -> Dict[str, DeviceRecord]:
+        """Devices whose connection was reported and whose disconnection wasn't yet"""
+        return {
+            device_id: tracked.record
+            for device_id, tracked in self._devices.items()
+            if tracked.state in (CONNECTED, PENDING_DISCONNECT)
+        }
+
+    def state_of(self, device_id: str) -> str:
+        tracked = self._devices.get(device_id)
+        return tracked.state if tracked is not None else GONE
+
+    def reset(self) -> None:
+        self._devices.clear()
+        self._pending = 0
+        self._last_devices = None
+        self.suppressed_flaps.clear()
+
+    def _suppress(self, record: DeviceRecord, reason: str) -> None:
+        self.suppressed_flaps[record.port_location] += 1
+        logger.debug(f"Suppressed flap on {record.port_location} for {record.device_id}: {reason}")
@@ -1,28 +1,61 @@
-import usb.core
-import usb.util
 import logging
 import time
-from datetime import datetime
 from core.events import EventSystem
+from .debounce import DeviceDebouncer
+from .device_record import DeviceRecord
+from .device_state import DeviceStateStore
 
 logger = logging.getLogger(__name__)
 
 # Apple's Vendor ID
 APPLE_VENDOR_ID = 0x05ac
 
+# Apple product IDs of iPhones and iPads in normal (not recovery/DFU) mode.
+# Every iPhone since the 5 reports 0x12a8 and every iPad since the 4th
+# generation 0x12ab; new IDs can be added with DEVICE_EXTRA_PRODUCT_IDS.
+IPHONE_PRODUCT_IDS = frozenset({0x1290, 0x1292, 0x1294, 0x1297, 0x129c, 0x12a0, 0x12a8})
+IPAD_PRODUCT_IDS = frozenset({0x129a, 0x129f, 0x12a2, 0x12a3, 0x12a4, 0x12a5, 0x12a6, 0x12a9, 0x12ab})
+SUPPORTED_PRODUCT_IDS = IPHONE_PRODUCT_IDS | IPAD_PRODUCT_IDS
+
 # Define event types
 DEVICE_CONNECTED = 'device_connected'
 DEVICE_DISCONNECTED = 'device_disconnected'
 
+def get_port_location(device):
+    """Return a static identifier for the port a device is plugged into
+    
+    Only uses topology that libusb already knows, so no control transfer is made.
+    """
+    port_numbers = getattr(device, 'port_numbers', None)
+    if port_numbers:
+        return f"b{device.bus}_p{'_'.join([str(p) for p in port_numbers])}"
+    return f"b{device.bus}_a{device.address}"
+
 class DeviceDetector:
     """Service for detecting and managing connected devices"""
     
-    # Track connected devices in memory
-    connected_devices = {}
+    # Versioned, copy-on-write snapshots of the connected devices
+    state = DeviceStateStore()
+    
+    # Read-only mapping of the latest snapshot, kept for existing readers
+    connected_devices = state.current.devices
+    
+    # Suppresses connect/disconnect flapping before events are published
+    debouncer = DeviceDebouncer()
+    
+    # Apple product IDs that are inspected, extended from DEVICE_EXTRA_PRODUCT_IDS
+    product_ids = SUPPORTED_PRODUCT_IDS
+    
+    @classmethod
+    def configure_product_ids(cls, extra_product_ids=()):
+        """Inspect the known iPhone/iPad product IDs plus ``extra_product_ids``"""
+        cls.product_ids = SUPPORTED_PRODUCT_IDS | frozenset(extra_product_ids)
     
     @staticmethod
     def get_device_info(device):
         """Extract useful information from a USB device"""
+        import usb.util
+        
         try:
             manufacturer = usb.util.get_string(device, device.iManufacturer) if device.iManufacturer else "Unknown"
             product = usb.util.get_string(device, device.iProduct) if device.iProduct else "Unknown"
@@ -40,76 +73,153 @@ class DeviceDetector:
             # Strip null characters and any whitespace
             device_id = serial.strip().split('\0')[0]
             
-            # Port location - simple static identifier
-            if hasattr(device, 'port_numbers'):
-                port_id = f"b{device.bus}_p{'_'.join([str(p) for p in device.port_numbers])}"
-            else:
-                port_id = f"b{device.bus}_a{device.address}"
+            port_id = get_port_location(device)
             
-            return {
-                'manufacturer': manufacturer,
-                'name': product,
-                'device_id': device_id,
-                'port_location': port_id
-            }
+            # Interned, so an unchanged device yields the same record every scan
+            return DeviceRecord(manufacturer, product, device_id, port_id)
         except Exception as e:
             logger.error(f"Error extracting device info: {str(e)}")
             return None
     
     @classmethod
-    def scan_devices(cls):
-        """Scan for all connected USB devices and track in memory"""
+    def enumerate_devices(cls, shard=None, product_ids=None):
+        """Return the connected iPhone/iPad records keyed by device_id
+        
+        Devices are selected by vendor and product ID (and, with a shard, by
+        the buses or ports it owns) while libusb enumerates them. Those come
+        from the cached device descriptor and topology, so other devices are
+        rejected without a control transfer and string descriptors are only
+        read for the devices that are kept.
+        """
+        # Imported on first scan so processes that never scan don't load libusb
+        import usb.core
+        
+        if product_ids is None:
+            product_ids = cls.product_ids
+        
+        def is_target(device):
+            if device.idProduct not in product_ids:
+                return False
+            return shard is None or shard.owns(device.bus, get_port_location(device))
+        
         currently_connected = {}
         
-        # Find all connected devices
+        for device in usb.core.find(find_all=True, idVendor=APPLE_VENDOR_ID, custom_match=is_target):
+            device_info = cls.get_device_info(device)
+            if device_info:
+                currently_connected[device_info.device_id] = device_info
+        
+        return currently_connected
+    
+    @classmethod
+    def apply_scan(cls, currently_connected):
+        """Publish a scan result as the new snapshot and emit connection events"""
+        previous = cls.state.current
+        snapshot = cls.state.swap(currently_connected)
+        cls.connected_devices = snapshot.devices
+        
+        if snapshot is not previous:
+            for device_info in snapshot.changed:
+                logger.info(f"Device moved or changed: {device_info}")
+        
+        # Only transitions that outlast the settle time become events
+        connected, disconnected = cls.debouncer.update(snapshot.devices)
+        
+        for device_info in connected:
+            # Log new device connection with details
+            logger.info(f"New device connected: {device_info}")
+            # Emit device connected event
+            EventSystem.publish(DEVICE_CONNECTED, device_info.to_json())
+        
+        for device_info in disconnected:
+            # Log device disconnection with details
+            logger.info(f"Device disconnected: {device_info}")
+            # Emit device disconnected event
+            EventSystem.publish(DEVICE_DISCONNECTED, device_info.to_json())
+        
+        return list(snapshot.devices.values())
+    
+    @classmethod
+    def scan_devices(cls):
+        """Scan for all connected USB devices and track in memory"""
         try:
-            devices = usb.core.find(find_all=True)
-            
-            for device in devices:
-                # Check if it's an Apple device
-                if device.idVendor == APPLE_VENDOR_ID:
-                    device_info = cls.get_device_info(device)
-                    if device_info:
-                        # Only include iPhone and iPad devices
-                        device_name = device_info['name']
-                        if 'iPhone' in device_name or 'iPad' in device_name:
-                            device_id = device_info['device_id']
-                            currently_connected[device_id] = device_info
-                            
-                            # Check if this is a new device
-                            if device_id not in cls.connected_devices:
-                                # Log new device connection with details
-                                logger.info(f"New device connected: {device_info}")
-                                # Emit device connected event
-                                EventSystem.publish(DEVICE_CONNECTED, device_info)
-            
-            # Check for disconnected devices
-            for device_id in list(cls.connected_devices.keys()):
-                if device_id not in currently_connected:
-                    # Log device disconnection with details
-                    disconnected_device = cls.connected_devices[device_id]
-                    logger.info(f"Device disconnected: {disconnected_device}")
-                    # Emit device disconnected event
-                    EventSystem.publish(DEVICE_DISCONNECTED, disconnected_device)
-                    del cls.connected_devices[device_id]
-            
-            # Update connected devices list
-            cls.connected_devices = currently_connected
-            
-            return list(cls.connected_devices.values())
-            
+            return cls.apply_scan(cls.enumerate_devices())
         except Exception as e:
             logger.error(f"Error scanning devices: {str(e)}")
             return []
 
     @classmethod
-    def start_polling(cls, interval=1):
-        """Start polling for device connections at regular intervals"""
+    def get_snapshot(cls):
+        """Return the latest DeviceSnapshot without locking"""
+        return cls.state.current
+    
+    @classmethod
+    def changes_since(cls, version):
+        """Return the net device changes since the given snapshot version"""
+        return cls.state.changes_since(version)
+
+    @classmethod
+    def journal_state(cls):
+        """Return the devices announced as connected, as stored in journal snapshots
+        
+        This follows the published events rather than the raw scan, so devices
+        still settling are not restored as connected.
+        """
+        return {device_id: record.to_json() for device_id, record in cls.debouncer.announced().items()}
+    
+    @classmethod
+    def restore_from_journal(cls, journal):
+        """Rebuild the connected devices from a journal after a restart
+        
+        Restored devices count as already connected, so the first scan only
+        publishes events for devices that really came or went while the
+        detector was down.
+        """
+        state, events = journal.load()
+        devices = dict(state or {})
+        for _, event_type, data in events:
+            if event_type == DEVICE_CONNECTED:
+                devices[data['device_id']] = data
+            elif event_type == DEVICE_DISCONNECTED:
+                devices.pop(data['device_id'], None)
+        
+        records = {device_id: DeviceRecord.from_json(data) for device_id, data in devices.items()}
+        snapshot = cls.state.swap(records)
+        cls.connected_devices = snapshot.devices
+        cls.debouncer.seed(records)
+        journal.state_provider = cls.journal_state
+        logger.info(f"Restored {len(records)} connected devices from event journal at offset {journal.next_offset}")
+        return list(records.values())
+
+    @classmethod
+    def open_journal(cls, directory):
+        """Restore the connected devices from the event journal in ``directory`` and journal new events there"""
+        from core.journal import EventJournal
+        
+        journal = EventJournal(directory)
+        cls.restore_from_journal(journal)
+        EventSystem.attach_journal(journal)
+        return journal
+    
+    @classmethod
+    def close_journal(cls, journal):
+        """Stop journaling events and flush the journal to disk"""
+        EventSystem.attach_journal(None)
+        journal.close()
+
+    @classmethod
+    def start_polling(cls, interval=1, after_scan=None):
+        """Start polling for device connections at regular intervals
+
+        ``after_scan`` is called with no arguments after every scan.
+        """
         logger.info(f"Starting device polling with interval of {interval} seconds")
         while True:
             try:
                 devices = cls.scan_devices()
                 logger.debug(f"Found {len(devices)} connected devices: {devices}")
+                if after_scan is not None:
+                    after_scan()
                 time.sleep(interval)
             except KeyboardInterrupt:
                 logger.info("Device polling stopped by user")
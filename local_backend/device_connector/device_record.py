@@ -0,0 +1,70 @@
+import weakref
+from typing import Any, Dict
+
+
+class DeviceRecord:
+    """Compact, immutable description of a connected USB device
+
+    Records are interned: building a record with the same field values as a
+    live one returns that same object, so repeated scans of an unchanged
+    device allocate nothing new and compare equal by identity.
+    """
+
+    __slots__ = ('manufacturer', 'name', 'device_id', 'port_location', '_key', '_hash', '__weakref__')
+
+    # Live records keyed by their field values
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, manufacturer: str, name: str, device_id: str, port_location: str):
+        key = (manufacturer, name, device_id, port_location)
+        record = cls._interned.get(key)
+        if record is not None:
+            return record
+
+        record = super().__new__(cls)
+        object.__setattr__(record, 'manufacturer', manufacturer)
+        object.__setattr__(record, 'name', name)
+        object.__setattr__(record, 'device_id', device_id)
+        object.__setattr__(record, 'port_location', port_location)
+        object.__setattr__(record, '_key', key)
+        object.__setattr__(record, '_hash', hash(key))
+        cls._interned[key] = record
+        return record
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, DeviceRecord):
+            return NotImplemented
+        return self._key == other._key
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        # Unpickled copies go back through __new__ and are interned again
+        return (DeviceRecord, self._key)
+
+    def __repr__(self):
+        return (f"DeviceRecord(manufacturer={self.manufacturer!r}, name={self.name!r}, "
+                f"device_id={self.device_id!r}, port_location={self.port_location!r})")
+
+    def to_json(self) -> Dict[str, Any]:
+        """Return a plain dict suitable for events and JSON responses"""
+        return {
+            'manufacturer': self.manufacturer,
+            'name': self.name,
+            'device_id': self.device_id,
+            'port_location': self.port_location,
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> 'DeviceRecord':
+        """Build (or reuse) a record from the output of ``to_json``"""
+        return cls(data['manufacturer'], data['name'], data['device_id'], data['port_location'])
@@ -0,0 +1,152 @@
+import threading
+from collections import deque
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Tuple
+
+# Number of past snapshots kept around for "what changed since version N"
+DEFAULT_HISTORY_SIZE = 256
+
+_EMPTY = MappingProxyType({})
+
+
+class DeviceSnapshot:
+    """Immutable view of the connected devices at a given version
+
+    ``added``, ``removed`` and ``changed`` hold the diff against the previous
+    snapshot so consumers never have to compare full device lists.
+    """
+
+    __slots__ = ('version', 'devices', 'added', 'removed', 'changed')
+
+    def __init__(self, version: int, devices: Mapping[str, Any],
+                 added: Tuple[Any, ...] = (), removed: Tuple[Any, ...] = (),
+                 changed: Tuple[Any, ...] = ()):
+        self.version = version
+        self.devices = devices
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    def __repr__(self):
+        return (f"DeviceSnapshot(version={self.version}, devices={len(self.devices)}, "
+                f"added={len(self.added)}, removed={len(self.removed)}, changed={len(self.changed)})")
+
+
+class DeviceChanges:
+    """Net changes between two snapshot versions"""
+
+    __slots__ = ('from_version', 'to_version', 'added', 'removed', 'changed', 'complete')
+
+    def __init__(self, from_version: int, to_version: int, added: Dict[str, Any],
+                 removed: Dict[str, Any], changed: Dict[str, Any], complete: bool = True):
+        self.from_version = from_version
+        self.to_version = to_version
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        # False when the requested version fell out of history; callers should
+        # then treat the current snapshot as a full resync
+        self.complete = complete
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+
+class DeviceStateStore:
+    """Copy-on-write holder of the current DeviceSnapshot
+
+    Readers just dereference ``current`` and never lock: a snapshot is never
+    mutated after it is published, and swapping the reference is atomic.
+    Writers are serialized by a lock so versions stay monotonic.
+    """
+
+    def __init__(self, history_size: int = DEFAULT_HISTORY_SIZE):
+        self._write_lock = threading.Lock()
+        self._history = deque(maxlen=history_size)
+        self.current = DeviceSnapshot(0, _EMPTY)
+        self._history.append(self.current)
+
+    @property
+    def version(self) -> int:
+        return self.current.version
+
+    def swap(self, devices: Dict[str, Any]) -> DeviceSnapshot:
+        """Publish a new device mapping and return the resulting snapshot
+
+        Devices are compared by identity first and equality second, so
+        unchanged entries reused from the previous scan cost a pointer check.
+        When nothing changed the current snapshot is returned as is.
+        """
+        with self._write_lock:
+            previous = self.current
+            old = previous.devices
+
+            added = tuple(device for device_id, device in devices.items() if device_id not in old)
+            removed = tuple(device for device_id, device in old.items() if device_id not in devices)
+            changed = tuple(
+                device for device_id, device in devices.items()
+                if device_id in old and old[device_id] is not device and old[device_id] != device
+            )
+
+            if not (added or removed or changed):
+                return previous
+
+            snapshot = DeviceSnapshot(
+                previous.version + 1,
+                MappingProxyType(dict(devices)),
+                added, removed, changed
+            )
+            self._history.append(snapshot)
+            self.current = snapshot
+            return snapshot
+
+    def changes_since(self, version: int) -> DeviceChanges:
+        """Return the net changes between ``version`` and the current snapshot"""
+        current = self.current
+        if version >= current.version:
+            return DeviceChanges(version, current.version, {}, {}, {})
+
+        history = list(self._history)
+        base = next((s for s in history if s.version == version), None)
+        if base is None:
+            # Too old to diff incrementally, report everything as added
+            return DeviceChanges(version, current.version, dict(current.devices), {}, {}, complete=False)
+
+        base_devices = base.devices
+        touched = set()
+        for snapshot in history:
+            if version < snapshot.version <= current.version:
+                for device in snapshot.added + snapshot.removed + snapshot.changed:
+                    touched.add(_device_id(device))
+
+        # Collapse the per-step diffs into a net diff against the base version
+        net_added, net_removed, net_changed = {}, {}, {}
+        for device_id in touched:
+            before = base_devices.get(device_id)
+            after = current.devices.get(device_id)
+            if before is None and after is not None:
+                net_added[device_id] = after
+            elif before is not None and after is None:
+                net_removed[device_id] = before
+            elif before is not None and after is not None and before != after:
+                net_changed[device_id] = after
+
+        return DeviceChanges(version, current.version, net_added, net_removed, net_changed)
+
+    def reset(self) -> None:
+        """Drop all state, mostly useful for tests"""
+        with self._write_lock:
+            self._history.clear()
+            self.current = DeviceSnapshot(0, _EMPTY)
+            self._history.append(self.current)
+
+
+def _device_id(device: Any) -> str:
+    if isinstance(device, Mapping):
+        return device['device_id']
+    return device.device_id
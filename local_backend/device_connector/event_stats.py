@@ -0,0 +1,60 @@
+import logging
+import socket
+import time
+from django.conf import settings
+from django.utils import timezone
+from core.events import EventSystem
+from .device_detection import DeviceDetector
+from .models import EventStatsSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Seconds between exports unless settings say otherwise
+DEFAULT_EXPORT_INTERVAL = 5
+
+class EventStatsExporter:
+    """Shares the event subscriber stats of the publishing process through the database
+
+    Device events are published where devices are scanned (the Celery polling
+    worker or poll_devices), so that is the only process whose subscriber
+    counters, latencies, breaker state and suppressed flaps mean anything.
+    It exports them periodically and the API reads them back.
+    """
+
+    # time.monotonic() value after which maybe_export() exports again
+    _next_export = 0.0
+
+    @staticmethod
+    def source_name(role):
+        """Identify the exporting process by host and role, so a restart replaces its row"""
+        return f"{socket.gethostname()}/{role}"
+
+    @classmethod
+    def maybe_export(cls, role):
+        """Export if ``EVENT_STATS_EXPORT_SECONDS`` passed since the last export"""
+        now = time.monotonic()
+        if now < cls._next_export:
+            return
+        cls._next_export = now + getattr(settings, 'EVENT_STATS_EXPORT_SECONDS', DEFAULT_EXPORT_INTERVAL)
+        try:
+            cls.export(role)
+        except Exception as e:
+            logger.error(f"Error exporting event subscriber stats: {str(e)}")
+
+    @classmethod
+    def export(cls, role):
+        EventStatsSnapshot.objects.update_or_create(
+            source=cls.source_name(role),
+            defaults={
+                'subscribers': EventSystem.subscriber_stats(),
+                'suppressed_flaps': dict(DeviceDetector.debouncer.suppressed_flaps),
+                'updated_at': timezone.now(),
+            }
+        )
+
+    @staticmethod
+    def load():
+        """Return the exported stats of every publishing process, most recent first"""
+        return list(EventStatsSnapshot.objects.order_by('-updated_at').values(
+            'source', 'updated_at', 'subscribers', 'suppressed_flaps'
+        ))
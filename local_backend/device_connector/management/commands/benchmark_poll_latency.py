@@ -0,0 +1,211 @@
+import multiprocessing
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+
+POLL_TASK = 'device_connector.tasks.poll_for_devices'
+QUEUES = ('celery', 'device_polling', 'device_info')
+
+
+def configure_app():
+    """The project's Celery app, moved onto an in-memory broker"""
+    from core.celery import app
+
+    # Keys keep the CELERY_ namespace so they take precedence over the settings
+    app.conf.update(
+        CELERY_BROKER_URL='memory://',
+        CELERY_RESULT_BACKEND=None,
+        CELERY_BROKER_TRANSPORT_OPTIONS={'polling_interval': 0.005},
+        CELERY_WORKER_HIJACK_ROOT_LOGGER=False,
+    )
+    return app
+
+
+def simulate_devices(options, started):
+    """Replace USB enumeration with devices that arrive at ``work_rate`` per second"""
+    from device_connector.device_record import DeviceRecord
+
+    def enumerate_devices(cls, shard=None, product_ids=None):
+        arrived = int((time.monotonic() - started) * options['work_rate'])
+        return {
+            f'benchmark-{n}': DeviceRecord('Apple Inc.', 'iPhone', f'benchmark-{n}', f'b{n // 64 + 1}_p{n % 64 + 1}')
+            for n in range(arrived)
+        }
+
+    return enumerate_devices
+
+
+def run_scenario(queued, options):
+    """Poll through the real poll_for_devices task while devices keep connecting
+
+    Each new device is announced by the scan and its info collected either
+    inline, as before collection was queued, or by the device_info worker.
+    Runs in a fresh process with its own throwaway database: the in-memory
+    broker and Celery's worker bookkeeping are process-wide, so scenarios
+    can't share one.
+    """
+    import django
+    django.setup()
+
+    from celery.contrib.testing.worker import start_worker
+    from celery.signals import task_postrun, task_revoked
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import override_settings
+    from kombu import Queue
+    from device_connector.device_detection import DeviceDetector
+    from device_connector.tasks import POLL_EXPIRES, poll_for_devices
+    from device_info.services import COLLECT_DEVICE_INFO_TASK, DeviceInfoService
+
+    app = configure_app()
+    directory = tempfile.mkdtemp(prefix='poll-latency-')
+    connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+    connection.settings_dict.setdefault('OPTIONS', {})['timeout'] = 30
+    connection.creation.create_test_db(verbosity=0)
+
+    sent_at, finished_at, expired_polls, queries = {}, {}, [], []
+
+    def on_postrun(task_id=None, task=None, **kwargs):
+        if task is not None and task.name == POLL_TASK:
+            finished_at[task_id] = time.monotonic()
+
+    def on_revoked(request=None, expired=False, **kwargs):
+        if expired and request is not None and request.task == POLL_TASK:
+            expired_polls.append(request.id)
+
+    task_postrun.connect(on_postrun, weak=False)
+    task_revoked.connect(on_revoked, weak=False)
+
+    query_device = DeviceInfoService.query_device.__func__
+
+    def slow_query_device(cls, device_info):
+        time.sleep(options['work_time'])
+        queries.append(device_info['device_id'])
+        return query_device(cls, device_info)
+
+    worker_options = dict(perform_ping_check=False, shutdown_timeout=options['work_time'] * 4 + 10)
+    sent = 0
+    started = time.monotonic()
+    with ExitStack() as stack:
+        # No journal, so the benchmark leaves the station's journal alone
+        stack.enter_context(override_settings(DEVICE_EVENT_JOURNAL_DIR=None, EVENT_STATS_EXPORT_SECONDS=60))
+        stack.enter_context(mock.patch.object(DeviceDetector, 'debouncer', DeviceDetector.debouncer.__class__(settle_time=0)))
+        stack.enter_context(mock.patch.object(
+            DeviceDetector, 'enumerate_devices', classmethod(simulate_devices(options, started))
+        ))
+        stack.enter_context(mock.patch.object(DeviceInfoService, 'query_device', classmethod(slow_query_device)))
+        if not queued:
+            # Before collection was queued, the polling worker queried each device itself
+            send_task = app.send_task
+
+            def collect_inline(name, args=None, *rest, **options):
+                if name == COLLECT_DEVICE_INFO_TASK:
+                    return DeviceInfoService.collect_device_info(*args)
+                return send_task(name, args, *rest, **options)
+
+            stack.enter_context(mock.patch.object(app, 'send_task', collect_inline))
+
+        polling_queue = settings.CELERY_TASK_ROUTES['device_connector.tasks.*']['queue']
+        info_queue = settings.CELERY_TASK_ROUTES['device_info.tasks.*']['queue']
+        stack.enter_context(start_worker(
+            app, pool='solo', queues=[polling_queue], hostname='polling@benchmark', **worker_options
+        ))
+        stack.enter_context(start_worker(
+            app, pool='threads', concurrency=options['concurrency'], queues=[info_queue],
+            hostname='info@benchmark', **worker_options
+        ))
+
+        next_poll = time.monotonic()
+        while time.monotonic() - started < options['duration']:
+            now = time.monotonic()
+            if now >= next_poll:
+                sent_at[poll_for_devices.delay().id] = time.monotonic()
+                sent += 1
+                next_poll += options['interval']
+            time.sleep(0.001)
+
+        # Give queued polls a chance to run or expire, then drop the rest
+        time.sleep(POLL_EXPIRES + options['work_time'])
+        with app.connection_for_write() as broker:
+            for name in QUEUES:
+                Queue(name).bind(broker.default_channel).purge()
+
+    connection.close()
+    shutil.rmtree(directory, ignore_errors=True)
+    latencies = [finished_at[task_id] - at for task_id, at in sent_at.items() if task_id in finished_at]
+    return {'sent': sent, 'latencies': latencies, 'expired': len(expired_polls), 'collected': len(queries)}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark device poll latency while newly connected devices are being queried'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=5,
+            help='Seconds to send polls for'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0.2,
+            help='Seconds between polls'
+        )
+        parser.add_argument(
+            '--work-time',
+            type=float,
+            default=0.5,
+            help='Seconds a simulated device info query takes'
+        )
+        parser.add_argument(
+            '--work-rate',
+            type=float,
+            default=8,
+            help='Devices connected per second'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=2,
+            help='Threads of the worker running collection tasks'
+        )
+
+    def handle(self, *args, **options):
+        """Run the same device arrivals with collection inline and queued"""
+        scenario_options = {
+            key: options[key]
+            for key in ('duration', 'interval', 'work_time', 'work_rate', 'concurrency')
+        }
+        self.stdout.write(
+            f'{"setup":<8} {"sent":>6} {"run":>6} {"expired":>8} {"stuck":>6} '
+            f'{"p50 ms":>9} {"p95 ms":>9} {"max ms":>9} {"queried":>8}'
+        )
+        context = multiprocessing.get_context('spawn')
+        for queued in (False, True):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_scenario, queued, scenario_options).result()
+
+            latencies = result['latencies']
+            if len(latencies) > 1:
+                p50 = statistics.median(latencies)
+                p95 = statistics.quantiles(latencies, n=20, method='inclusive')[18]
+                worst = max(latencies)
+            else:
+                p50 = p95 = worst = latencies[0] if latencies else float('nan')
+            self.stdout.write(
+                f'{"queued" if queued else "inline":<8} {result["sent"]:>6} {len(latencies):>6} '
+                f'{result["expired"]:>8} {result["sent"] - len(latencies) - result["expired"]:>6} '
+                f'{p50 * 1000:>9.1f} {p95 * 1000:>9.1f} {worst * 1000:>9.1f} {result["collected"]:>8}'
+            )
+        self.stdout.write(
+            'inline: the polling worker queries each new device before finishing the poll (the previous behaviour)\n'
+            'queued: new devices are queried by collect_device_info on the device_info worker'
+        )
@@ -0,0 +1,105 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from core.tenancy import get_request_tenant, invalidate_tenant_cache
+from device_connector import views as device_views
+from device_connector.models import Device
+from device_info import views as device_info_views
+from device_info.models import DeviceInfo
+
+
+class Command(BaseCommand):
+    help = 'Benchmark tenant-scoped list endpoints as the number of tenants and rows grows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenants',
+            default='1,10,100',
+            help='Comma separated tenant counts to measure at'
+        )
+        parser.add_argument(
+            '--rows-per-tenant',
+            type=int,
+            default=50,
+            help='Devices seeded for each tenant'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Requests per endpoint and step'
+        )
+
+    def handle(self, *args, **options):
+        steps = sorted(int(value) for value in options['tenants'].split(','))
+        rows = options['rows_per_tenant']
+        repeat = options['repeat']
+        endpoints = [
+            ('device_list', device_views.device_list, '/api/devices/'),
+            ('connected_devices', device_views.connected_devices, '/api/devices/connected/'),
+            ('device_info_list', device_info_views.device_info_list, '/api/device-info/'),
+        ]
+        factory = RequestFactory()
+        probe_tenant = 'bench-0'
+
+        self.stdout.write(f'{"tenants":>8} {"rows":>8} {"endpoint":<18} {"cold ms":>9} {"warm ms":>9}')
+
+        # Seed inside a transaction that is rolled back, leaving the database untouched
+        with transaction.atomic():
+            seeded = 0
+            for tenant_count in steps:
+                self._seed(range(seeded, tenant_count), rows)
+                seeded = tenant_count
+
+                for name, view, path in endpoints:
+                    cold, warm = [], []
+                    for _ in range(repeat):
+                        request = factory.get(path, HTTP_X_TENANT_ID=probe_tenant)
+                        # The views are called directly, so do what TenantMiddleware would
+                        request.tenant = get_request_tenant(request)
+                        invalidate_tenant_cache(probe_tenant)
+                        cold.append(self._time(view, request))
+                        warm.append(self._time(view, request))
+                    self.stdout.write(
+                        f'{tenant_count:>8} {tenant_count * rows:>8} {name:<18} '
+                        f'{statistics.median(cold):>9.3f} {statistics.median(warm):>9.3f}'
+                    )
+
+            plan = Device.objects.for_tenant(probe_tenant).filter(is_connected=True).explain()
+            self.stdout.write(f'Connected devices query plan: {plan}')
+
+            transaction.set_rollback(True)
+
+    def _seed(self, tenant_indexes, rows):
+        now = timezone.now()
+        devices, infos = [], []
+        for tenant_index in tenant_indexes:
+            tenant_id = f'bench-{tenant_index}'
+            for row in range(rows):
+                device_id = f'{tenant_index:06d}{row:06d}'
+                devices.append(Device(
+                    tenant_id=tenant_id, manufacturer='Apple', name='iPhone',
+                    port_location=f'b1_p{row}', device_id=device_id,
+                    is_connected=row % 2 == 0, first_connected=now, last_seen=now,
+                ))
+                infos.append(DeviceInfo(
+                    tenant_id=tenant_id, device_id=device_id, product_type='iPhone15,3',
+                    model_name='iPhone 14 Pro Max', ios_version='17.4.1',
+                    battery_level=80, storage_total=256 * 1024 ** 3, storage_used=100 * 1024 ** 3,
+                    last_updated=now,
+                ))
+        Device.objects.bulk_create(devices, batch_size=500)
+        DeviceInfo.objects.bulk_create(infos, batch_size=500)
+
+    @staticmethod
+    def _time(view, request):
+        start = time.perf_counter()
+        response = view(request)
+        elapsed = (time.perf_counter() - start) * 1000
+        assert response.status_code == 200, response.status_code
+        return elapsed
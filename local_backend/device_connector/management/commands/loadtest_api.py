@@ -0,0 +1,323 @@
+import asyncio
+import contextvars
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from core import serialization
+from device_connector.models import Device
+from device_info.models import DeviceInfo
+
+try:
+    import resource
+except ImportError:  # Not available on Windows, memory is then not reported
+    resource = None
+
+ENDPOINTS = {
+    'devices': '/api/devices/',
+    'connected': '/api/devices/connected/',
+    'device-info': '/api/device-info/',
+}
+INTERFACES = ('wsgi', 'asgi')
+
+# Host the requests are sent to; allowed by Django while DEBUG is on
+HOST = 'localhost'
+
+# Query counter of the request being served, shared by every DB connection
+_request_queries = contextvars.ContextVar('loadtest_request_queries', default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def _install_query_counter(sender, connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def max_rss_mb():
+    """Memory high-water mark of this process in MB"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return max_rss / 1024 ** 2 if sys.platform == 'darwin' else max_rss / 1024
+
+
+class Command(BaseCommand):
+    help = 'Load test the device list endpoints through the WSGI and ASGI applications'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenants',
+            type=int,
+            default=1,
+            help='Tenants to seed, requests are spread over them'
+        )
+        parser.add_argument(
+            '--devices',
+            type=int,
+            default=500,
+            help='Devices (with device info) seeded per tenant'
+        )
+        parser.add_argument(
+            '--clients',
+            default='1,8,32',
+            help='Comma separated numbers of concurrent clients to measure at'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=300,
+            help='Requests per endpoint, interface and client count'
+        )
+        parser.add_argument(
+            '--endpoints',
+            default=','.join(ENDPOINTS),
+            help=f'Comma separated endpoints to load ({", ".join(ENDPOINTS)})'
+        )
+        parser.add_argument(
+            '--interfaces',
+            default=','.join(INTERFACES),
+            help='Comma separated server interfaces to drive (wsgi, asgi)'
+        )
+        parser.add_argument(
+            '--format',
+            default=serialization.JSON,
+            choices=list(serialization.CONTENT_TYPES),
+            help='Response layout to request'
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Send Accept-Encoding: gzip, br so responses are compressed'
+        )
+        parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='Disable the per-tenant response cache so every request hits the database'
+        )
+
+    def handle(self, *args, **options):
+        endpoints = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+        interfaces = [name.strip() for name in options['interfaces'].split(',') if name.strip()]
+        unknown = [name for name in endpoints if name not in ENDPOINTS] + [
+            name for name in interfaces if name not in INTERFACES
+        ]
+        if unknown:
+            raise CommandError(f"Unknown endpoint or interface: {', '.join(unknown)}")
+        client_counts = sorted(int(value) for value in options['clients'].split(','))
+        tenants = [f'load-{index}' for index in range(options['tenants'])]
+
+        # Run against a throwaway in-memory database so the station's data is untouched
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        connection_created.connect(_install_query_counter)
+        _install_query_counter(None, connection)
+        try:
+            started = time.perf_counter()
+            self._seed(tenants, options['devices'])
+            self.stdout.write(
+                f'Seeded {len(tenants) * options["devices"]} devices for {len(tenants)} tenant(s) '
+                f'in {time.perf_counter() - started:.1f}s, max RSS {self._format_rss(max_rss_mb())}'
+            )
+            cache.clear()
+
+            timeout = {'TENANT_CACHE_TIMEOUT': 0} if options['no_cache'] else {}
+            with override_settings(**timeout):
+                self._run(interfaces, endpoints, client_counts, tenants, options)
+        finally:
+            connection_created.disconnect(_install_query_counter)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _run(self, interfaces, endpoints, client_counts, tenants, options):
+        self.stdout.write(
+            f'{"interface":<9} {"endpoint":<12} {"clients":>7} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} '
+            f'{"p99 ms":>8} {"errors":>6} {"queries":>7} {"KB/resp":>8} {"RSS MB":>7}'
+        )
+        headers = {'Accept': serialization.CONTENT_TYPES[options['format']]}
+        if options['gzip']:
+            headers['Accept-Encoding'] = 'gzip, br'
+
+        for interface in interfaces:
+            if interface == 'wsgi':
+                from core.wsgi import application
+                runner = self._run_wsgi
+            else:
+                from core.asgi import application
+                runner = self._run_asgi
+
+            for endpoint in endpoints:
+                for clients in client_counts:
+                    requests = [
+                        (ENDPOINTS[endpoint], tenants[index % len(tenants)])
+                        for index in range(options['requests'])
+                    ]
+                    started = time.perf_counter()
+                    results = runner(application, requests, clients, headers)
+                    elapsed = time.perf_counter() - started
+                    self._report(interface, endpoint, clients, results, elapsed)
+
+    def _run_wsgi(self, application, requests, clients, headers):
+        """Send the requests from ``clients`` threads, each calling the WSGI app in turn"""
+        pending = iter(requests)
+        lock = threading.Lock()
+        results = []
+
+        def client():
+            while True:
+                with lock:
+                    request = next(pending, None)
+                if request is None:
+                    return
+                results.append(self._wsgi_request(application, *request, headers))
+
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            for future in [executor.submit(client) for _ in range(clients)]:
+                future.result()
+        return results
+
+    def _wsgi_request(self, application, path, tenant_id, headers):
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'SCRIPT_NAME': '',
+            'PATH_INFO': path,
+            'QUERY_STRING': '',
+            'SERVER_NAME': HOST,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': HOST,
+            'HTTP_X_TENANT_ID': tenant_id,
+            'REMOTE_ADDR': '127.0.0.1',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': BytesIO(),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in headers.items():
+            environ['HTTP_' + name.upper().replace('-', '_')] = value
+
+        status = []
+        counter = [0]
+        token = _request_queries.set(counter)
+        started = time.perf_counter()
+        try:
+            body = application(environ, lambda code, response_headers, exc_info=None: status.append(code))
+            try:
+                size = sum(len(chunk) for chunk in body)
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+        finally:
+            _request_queries.reset(token)
+        return time.perf_counter() - started, status[0].startswith('200'), counter[0], size
+
+    def _run_asgi(self, application, requests, clients, headers):
+        """Send the requests from ``clients`` coroutines on one event loop"""
+        async def run():
+            pending = iter(requests)
+            results = []
+
+            async def client():
+                for request in pending:
+                    results.append(await self._asgi_request(application, *request, headers))
+
+            await asyncio.gather(*(client() for _ in range(clients)))
+            return results
+
+        return asyncio.run(run())
+
+    async def _asgi_request(self, application, path, tenant_id, headers):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [(b'host', HOST.encode()), (b'x-tenant-id', tenant_id.encode())] + [
+                (name.lower().encode(), value.encode()) for name, value in headers.items()
+            ],
+            'client': ('127.0.0.1', 50000),
+            'server': (HOST, 80),
+        }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        counter = [0]
+        token = _request_queries.set(counter)
+        started = time.perf_counter()
+        try:
+            await application(scope, receive, send)
+        finally:
+            _request_queries.reset(token)
+        elapsed = time.perf_counter() - started
+        status = next(message['status'] for message in messages if message['type'] == 'http.response.start')
+        size = sum(len(message.get('body', b'')) for message in messages if message['type'] == 'http.response.body')
+        return elapsed, status == 200, counter[0], size
+
+    def _report(self, interface, endpoint, clients, results, elapsed):
+        latencies = sorted(result[0] * 1000 for result in results)
+        errors = sum(1 for result in results if not result[1])
+        queries = statistics.mean(result[2] for result in results)
+        size = statistics.mean(result[3] for result in results) / 1024
+        if len(latencies) > 1:
+            percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+            p50, p95, p99 = percentiles[49], percentiles[94], percentiles[98]
+        else:
+            p50 = p95 = p99 = latencies[0]
+        self.stdout.write(
+            f'{interface:<9} {endpoint:<12} {clients:>7} {len(results) / elapsed:>8.1f} {p50:>8.2f} {p95:>8.2f} '
+            f'{p99:>8.2f} {errors:>6} {queries:>7.2f} {size:>8.1f} {self._format_rss(max_rss_mb()):>7}'
+        )
+
+    @staticmethod
+    def _format_rss(value):
+        return f'{value:.1f}' if value is not None else '-'
+
+    def _seed(self, tenants, count):
+        now = timezone.now()
+        devices, infos = [], []
+        for tenant_index, tenant_id in enumerate(tenants):
+            for row in range(count):
+                device_id = f'{tenant_index:06d}{row:06d}'
+                devices.append(Device(
+                    tenant_id=tenant_id, manufacturer='Apple Inc.', name='iPhone' if row % 4 else 'iPad',
+                    port_location=f'b{row % 4 + 1}_p{row % 16 + 1}', device_id=device_id,
+                    is_connected=row % 2 == 0, first_connected=now, last_seen=now,
+                ))
+                infos.append(DeviceInfo(
+                    tenant_id=tenant_id, device_id=device_id, imei=f'35{tenant_index:06d}{row:07d}',
+                    serial_number=f'F{tenant_index:04X}{row:07X}', product_type='iPhone15,3',
+                    model_number='MQ8T3', region_info='LL/A', region_info_human_readable='United States',
+                    model_name='iPhone 14 Pro Max', storage_capacity='256 GB', ios_version='17.4.1',
+                    activation_state='Activated', findmy_status='Off', housing_color='Space Black',
+                    battery_level=row % 100, storage_total=256 * 1024 ** 3, storage_used=row % 256 * 1024 ** 3,
+                    last_updated=now,
+                ))
+        Device.objects.bulk_create(devices, batch_size=500)
+        DeviceInfo.objects.bulk_create(infos, batch_size=500)
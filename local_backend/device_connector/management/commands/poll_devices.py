@@ -1,9 +1,14 @@
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 from device_connector.device_detection import DeviceDetector
+from device_connector.event_stats import EventStatsExporter
+from device_connector.registry import DeviceRegistry
 import logging
 
 class Command(BaseCommand):
     help = 'Start polling for device connections'
+    # Polling serves no URLs or admin, so skip the system checks on (re)start
+    requires_system_checks = []
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -12,9 +17,62 @@ class Command(BaseCommand):
             default=1,
             help='Polling interval in seconds'
         )
+        parser.add_argument(
+            '--settle-time',
+            type=float,
+            default=None,
+            help='Seconds a device must stay connected or disconnected before an event '
+                 'is published (default: DEVICE_SETTLE_SECONDS)'
+        )
+        parser.add_argument(
+            '--journal-dir',
+            default=None,
+            help='Directory of the event journal used to restore state after a restart '
+                 '(default: DEVICE_EVENT_JOURNAL_DIR)'
+        )
+        parser.add_argument(
+            '--no-journal',
+            action='store_true',
+            help='Run without the event journal'
+        )
+        parser.add_argument(
+            '--shards',
+            type=int,
+            default=0,
+            help='Split USB buses evenly across this many scanning processes'
+        )
+        parser.add_argument(
+            '--shard',
+            action='append',
+            default=[],
+            metavar='SPEC',
+            help='Run a scanning process for the given buses or ports, '
+                 'e.g. --shard bus=1,2 --shard port=b3_p1 (repeatable)'
+        )
+        parser.add_argument(
+            '--migration-grace',
+            type=float,
+            default=None,
+            help='Seconds to keep a device released by one shard before reporting it '
+                 'disconnected (default: twice the interval)'
+        )
 
     def handle(self, *args, **options):
+        # Only needed here, keeps multiprocessing out of every manage.py invocation
+        from device_connector.sharding import ShardSpec, start_sharded_polling
+        
         interval = options['interval']
+        if options['shards'] and options['shard']:
+            raise CommandError('Use either --shards or --shard, not both')
+        try:
+            shards = [ShardSpec.parse(index, spec) for index, spec in enumerate(options['shard'])]
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['shards']:
+            shards = ShardSpec.by_bus_modulus(options['shards'])
+        if options['settle_time'] is not None:
+            DeviceDetector.debouncer.settle_time = options['settle_time']
+        
         self.stdout.write(self.style.SUCCESS(f'Starting device polling with interval of {interval} seconds'))
         
         # Configure logging
@@ -27,10 +85,28 @@ class Command(BaseCommand):
             ]
         )
         
+        journal = None
+        journal_dir = options['journal_dir'] or getattr(settings, 'DEVICE_EVENT_JOURNAL_DIR', None)
+        if journal_dir and not options['no_journal']:
+            journal = DeviceDetector.open_journal(journal_dir)
+        # Devices unplugged while polling was stopped are marked disconnected;
+        # without a journal every device is then announced again
+        DeviceRegistry.reconcile(DeviceDetector.get_snapshot().devices)
+        # Subscriber stats only exist in this process; share them with the API
+        export_stats = lambda: EventStatsExporter.maybe_export('poll_devices')
+        
         try:
             # Start the polling service
-            DeviceDetector.start_polling(interval=interval)
+            if shards:
+                self.stdout.write(f'Running {len(shards)} detector shards: {shards}')
+                start_sharded_polling(shards, interval=interval, migration_grace=options['migration_grace'],
+                                      after_scan=export_stats)
+            else:
+                DeviceDetector.start_polling(interval=interval, after_scan=export_stats)
         except KeyboardInterrupt:
             self.stdout.write(self.style.SUCCESS('Device polling stopped by user'))
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Error in device polling: {str(e)}')) 
\ No newline at end of file
+            self.stdout.write(self.style.ERROR(f'Error in device polling: {str(e)}'))
+        finally:
+            if journal is not None:
+                DeviceDetector.close_journal(journal) 
\ No newline at end of file
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from django_celery_beat.models import PeriodicTask, IntervalSchedule
+from device_connector.tasks import POLL_EXPIRES
 
 class Command(BaseCommand):
     help = 'Set up periodic Celery tasks for device polling'
@@ -11,6 +12,18 @@ class Command(BaseCommand):
             default=1,
             help='Polling interval in seconds'
         )
+        parser.add_argument(
+            '--stats-interval',
+            type=int,
+            default=300,
+            help='Interval in seconds for the full fleet statistics recompute'
+        )
+        parser.add_argument(
+            '--poll-expires',
+            type=int,
+            default=POLL_EXPIRES,
+            help='Seconds after which a queued poll is discarded instead of run late'
+        )
 
     def handle(self, *args, **options):
         interval_seconds = options['interval']
@@ -27,6 +40,8 @@ class Command(BaseCommand):
             defaults={
                 'task': 'device_connector.tasks.poll_for_devices',
                 'interval': schedule,
+                'queue': 'device_polling',
+                'expire_seconds': options['poll_expires'],
                 'enabled': True,
             }
         )
@@ -36,4 +51,27 @@ class Command(BaseCommand):
             self.style.SUCCESS(
                 f'{action} periodic task to poll for devices every {interval_seconds} second(s)'
             )
-        ) 
\ No newline at end of file
+        )
+        
+        stats_interval = options['stats_interval']
+        stats_schedule, _ = IntervalSchedule.objects.get_or_create(
+            every=stats_interval,
+            period=IntervalSchedule.SECONDS,
+        )
+        _, created = PeriodicTask.objects.update_or_create(
+            name='Recompute fleet statistics',
+            defaults={
+                'task': 'device_info.tasks.recompute_fleet_stats',
+                'interval': stats_schedule,
+                'queue': 'device_info',
+                'expire_seconds': stats_interval,
+                'enabled': True,
+            }
+        )
+        
+        action = 'Created' if created else 'Updated'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{action} periodic task to recompute fleet statistics every {stats_interval} second(s)'
+            )
+        )
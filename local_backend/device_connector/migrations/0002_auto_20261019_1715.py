@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('device_connector', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='tenant_id',
+            field=models.CharField(default='default', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='device',
+            name='device_id',
+            field=models.CharField(max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['tenant_id', 'is_connected'], name='device_tenant_connected_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='device',
+            constraint=models.UniqueConstraint(fields=('tenant_id', 'device_id'), name='device_unique_per_tenant'),
+        ),
+    ]
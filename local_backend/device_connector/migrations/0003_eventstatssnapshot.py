@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:54
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('device_connector', '0002_auto_20261019_1715'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventStatsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, unique=True)),
+                ('subscribers', models.JSONField(default=list)),
+                ('suppressed_flaps', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -1,14 +1,38 @@
 from django.db import models
 from django.utils import timezone
+from core.tenancy import DEFAULT_TENANT_ID, TenantManager
 
 class Device(models.Model):
+    tenant_id = models.CharField(max_length=255, default=DEFAULT_TENANT_ID)
     manufacturer = models.CharField(max_length=255)
     name = models.CharField(max_length=255, blank=True, null=True)
     port_location = models.CharField(max_length=255)
-    device_id = models.CharField(max_length=255, unique=True)
+    device_id = models.CharField(max_length=255)
     is_connected = models.BooleanField(default=True)
     first_connected = models.DateTimeField(default=timezone.now)
     last_seen = models.DateTimeField(default=timezone.now)
     
+    objects = TenantManager()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tenant_id', 'device_id'], name='device_unique_per_tenant'),
+        ]
+        indexes = [
+            models.Index(fields=['tenant_id', 'is_connected'], name='device_tenant_connected_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.manufacturer} - {self.name or 'Unknown'} ({self.device_id})"
+
+
+class EventStatsSnapshot(models.Model):
+    """Event subscriber stats last exported by a process that publishes device events"""
+    
+    source = models.CharField(max_length=255, unique=True)
+    subscribers = models.JSONField(default=list)
+    suppressed_flaps = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"Event stats of {self.source} at {self.updated_at}"
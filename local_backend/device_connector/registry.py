@@ -0,0 +1,67 @@
+import logging
+from django.utils import timezone
+from core.events import EventSystem
+from core.tenancy import invalidate_tenant_cache, station_tenant_id
+from .device_detection import DEVICE_CONNECTED, DEVICE_DISCONNECTED
+from .models import Device
+
+logger = logging.getLogger(__name__)
+
+class DeviceRegistry:
+    """Keeps the station's Device rows in step with the connection events
+
+    ``Device.is_connected`` is the one record of which devices are connected
+    that every process can read; the detector's in-memory snapshot only
+    exists in the process that scans.
+    """
+
+    @classmethod
+    def initialize(cls):
+        """Subscribe to the device events"""
+        EventSystem.subscribe(DEVICE_CONNECTED, cls.handle_device_connected)
+        EventSystem.subscribe(DEVICE_DISCONNECTED, cls.handle_device_disconnected)
+
+    @classmethod
+    def handle_device_connected(cls, device_info):
+        """Mark a device as connected, creating its row on first sight
+
+        Idempotent, so a device announced again after a detector restart is
+        not counted twice.
+        """
+        Device.objects.update_or_create(
+            tenant_id=station_tenant_id(),
+            device_id=device_info['device_id'],
+            defaults={
+                'manufacturer': device_info['manufacturer'],
+                'name': device_info['name'],
+                'port_location': device_info['port_location'],
+                'is_connected': True,
+                'last_seen': timezone.now(),
+            }
+        )
+
+    @classmethod
+    def handle_device_disconnected(cls, device_info):
+        """Mark a device as disconnected"""
+        tenant_id = station_tenant_id()
+        updated = Device.objects.for_tenant(tenant_id).filter(device_id=device_info['device_id']).update(
+            is_connected=False, last_seen=timezone.now()
+        )
+        if updated:
+            # update() doesn't send post_save
+            invalidate_tenant_cache(tenant_id)
+
+    @classmethod
+    def reconcile(cls, connected_ids):
+        """Mark every station device not in ``connected_ids`` as disconnected
+
+        Called when a detector starts, since devices unplugged while it was
+        down never get a disconnect event.
+        """
+        tenant_id = station_tenant_id()
+        stale = Device.objects.for_tenant(tenant_id).filter(is_connected=True).exclude(device_id__in=list(connected_ids))
+        updated = stale.update(is_connected=False)
+        if updated:
+            logger.info(f"Marked {updated} device(s) that left while the detector was down as disconnected")
+            invalidate_tenant_cache(tenant_id)
+        return updated
@@ -0,0 +1,218 @@
+import logging
+import multiprocessing
+import queue
+import time
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from .device_detection import DeviceDetector
+from .device_record import DeviceRecord
+
+logger = logging.getLogger(__name__)
+
+# Seconds without a report after which an idle shard re-sends its state
+HEARTBEAT_INTERVAL = 5
+
+# Log format of the shard processes, which don't inherit the parent's handlers
+SHARD_LOG_FORMAT = '%(asctime)s [%(levelname)s] %(processName)s: %(message)s'
+
+
+class ShardSpec:
+    """Describes which USB buses or ports a detector shard owns
+
+    A shard owns a device when it matches any of its criteria: an explicit bus
+    number, a ``port_location`` prefix (e.g. ``b1_p2``), or ``bus % modulus``
+    equal to the shard index.
+    """
+
+    def __init__(self, index: int, buses: Iterable[int] = (), port_prefixes: Iterable[str] = (),
+                 modulus: Optional[int] = None):
+        self.index = index
+        self.buses: FrozenSet[int] = frozenset(buses)
+        self.port_prefixes: Tuple[str, ...] = tuple(port_prefixes)
+        self.modulus = modulus
+
+    def owns(self, bus: int, port_location: str) -> bool:
+        if bus in self.buses:
+            return True
+        if self.modulus and bus % self.modulus == self.index:
+            return True
+        # A prefix must end on a port boundary so "b1_p1" doesn't own "b1_p12"
+        return any(
+            port_location == prefix or port_location.startswith(prefix + '_')
+            for prefix in self.port_prefixes
+        )
+
+    @classmethod
+    def parse(cls, index: int, spec: str) -> 'ShardSpec':
+        """Parse a command-line shard spec such as ``bus=1,2`` or ``port=b1_p1,b2``"""
+        kind, _, values = spec.partition('=')
+        items = [v.strip() for v in values.split(',') if v.strip()]
+        if not items:
+            raise ValueError(f"Shard spec '{spec}' has no values")
+        if kind == 'bus':
+            return cls(index, buses=[int(v) for v in items])
+        if kind == 'port':
+            return cls(index, port_prefixes=items)
+        raise ValueError(f"Unknown shard spec '{spec}', expected bus=... or port=...")
+
+    @classmethod
+    def by_bus_modulus(cls, count: int) -> List['ShardSpec']:
+        """Split buses evenly across ``count`` shards"""
+        return [cls(index, modulus=count) for index in range(count)]
+
+    def __repr__(self):
+        parts = []
+        if self.buses:
+            parts.append(f"buses={sorted(self.buses)}")
+        if self.port_prefixes:
+            parts.append(f"ports={list(self.port_prefixes)}")
+        if self.modulus:
+            parts.append(f"bus%{self.modulus}=={self.index}")
+        return f"ShardSpec({self.index}, {', '.join(parts)})"
+
+
+def run_shard_worker(spec: ShardSpec, interval: float, reports, stop_event,
+                     product_ids: Optional[FrozenSet[int]] = None) -> None:
+    """Scan the devices owned by one shard and report changes to the coordinator
+
+    Runs in its own process, which doesn't load the Django settings, so the
+    product IDs to scan for are passed in by the parent. Reports are ``(shard_index, observed_at, devices)``
+    tuples where ``devices`` is a list of ``DeviceRecord.to_json()`` dicts.
+    """
+    logging.basicConfig(level=logging.INFO, format=SHARD_LOG_FORMAT)
+    logger.info(f"Starting detector shard {spec}")
+    last_devices = None
+    last_report = 0.0
+
+    try:
+        while not stop_event.is_set():
+            try:
+                devices = DeviceDetector.enumerate_devices(shard=spec, product_ids=product_ids)
+                now = time.time()
+                # Records are interned, so an unchanged scan compares by identity
+                if devices != last_devices or now - last_report >= HEARTBEAT_INTERVAL:
+                    reports.put((spec.index, now, [record.to_json() for record in devices.values()]))
+                    last_devices = devices
+                    last_report = now
+            except Exception as e:
+                logger.error(f"Error scanning devices in shard {spec.index}: {str(e)}")
+            stop_event.wait(interval)
+    except KeyboardInterrupt:
+        # Ctrl-C reaches every process in the group; the parent handles shutdown
+        logger.info(f"Detector shard {spec.index} stopped by user")
+
+
+class ShardCoordinator:
+    """Merges per-shard scan reports into the global DeviceDetector view
+
+    Each device is owned by the shard that reported it most recently. When a
+    device moves to a bus owned by another shard, both shards may briefly
+    report it (or neither, between scans); the newest observation wins and a
+    device released by one shard is kept for ``migration_grace`` seconds so a
+    migration shows up as a port change rather than a disconnect/connect pair.
+    """
+
+    def __init__(self, migration_grace: float = 2.0):
+        self.migration_grace = migration_grace
+        # device_id -> (shard_index, observed_at, record)
+        self.owners: Dict[str, Tuple[int, float, DeviceRecord]] = {}
+        # device_id -> time the owning shard stopped reporting it
+        self.released: Dict[str, float] = {}
+
+    def apply_report(self, shard_index: int, observed_at: float, devices: List[dict]) -> None:
+        reported = set()
+        for data in devices:
+            record = DeviceRecord.from_json(data)
+            device_id = record.device_id
+            reported.add(device_id)
+            current = self.owners.get(device_id)
+            if current is not None and current[0] != shard_index:
+                if device_id not in self.released and current[1] > observed_at:
+                    # The other shard saw it more recently, keep its claim
+                    continue
+                logger.info(f"Device {device_id} migrated from shard {current[0]} to shard {shard_index}")
+            self.owners[device_id] = (shard_index, observed_at, record)
+            self.released.pop(device_id, None)
+
+        for device_id, (owner, _, _) in self.owners.items():
+            if owner == shard_index and device_id not in reported:
+                self.released.setdefault(device_id, observed_at)
+
+    def drop_shard(self, shard_index: int, now: float) -> None:
+        """Release every device owned by a shard whose worker went away"""
+        for device_id, (owner, _, _) in self.owners.items():
+            if owner == shard_index:
+                self.released.setdefault(device_id, now)
+
+    def expire(self, now: float) -> None:
+        for device_id, released_at in list(self.released.items()):
+            if now - released_at >= self.migration_grace:
+                del self.released[device_id]
+                del self.owners[device_id]
+
+    def merged(self) -> Dict[str, DeviceRecord]:
+        return {device_id: record for device_id, (_, _, record) in self.owners.items()}
+
+
+def start_sharded_polling(shards: List[ShardSpec], interval: float = 1,
+                          migration_grace: Optional[float] = None,
+                          after_scan: Optional[Callable[[], None]] = None) -> None:
+    """Run one scanning process per shard and publish their merged view
+
+    USB enumeration happens in the worker processes; connection events are
+    published from this process, where the event subscribers live.
+    ``after_scan`` is called after every merged view is applied.
+    """
+    if migration_grace is None:
+        migration_grace = interval * 2
+    # spawn keeps each worker's libusb context independent of the parent
+    context = multiprocessing.get_context('spawn')
+    reports = context.Queue()
+    stop_event = context.Event()
+    coordinator = ShardCoordinator(migration_grace=migration_grace)
+
+    def spawn(spec):
+        process = context.Process(
+            target=run_shard_worker,
+            args=(spec, interval, reports, stop_event, DeviceDetector.product_ids),
+            name=f"device-shard-{spec.index}",
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    workers = {spec.index: (spec, spawn(spec)) for spec in shards}
+    # Hold back the merged view until every shard has scanned once, so devices
+    # restored from the journal aren't reported gone while workers start up
+    reported = set()
+    logger.info(f"Started {len(workers)} detector shards with interval of {interval} seconds")
+
+    try:
+        while True:
+            try:
+                shard_index, observed_at, devices = reports.get(timeout=interval)
+                coordinator.apply_report(shard_index, observed_at, devices)
+                reported.add(shard_index)
+            except queue.Empty:
+                pass
+
+            now = time.time()
+            for index, (spec, process) in list(workers.items()):
+                if not process.is_alive():
+                    logger.warning(f"Detector shard {index} exited with code {process.exitcode}, restarting")
+                    coordinator.drop_shard(index, now)
+                    workers[index] = (spec, spawn(spec))
+
+            coordinator.expire(now)
+            if len(reported) >= len(workers):
+                DeviceDetector.apply_scan(coordinator.merged())
+                if after_scan is not None:
+                    after_scan()
+    except KeyboardInterrupt:
+        logger.info("Sharded device polling stopped by user")
+    finally:
+        stop_event.set()
+        for _, process in workers.values():
+            process.join(timeout=interval + 1)
+            if process.is_alive():
+                process.terminate()
@@ -1,59 +1,106 @@
 import logging
 from celery import shared_task
 from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import worker_process_shutdown, worker_shutdown
+from django.conf import settings
 from .device_detection import DeviceDetector
+from .event_stats import EventStatsExporter
 
 logger = logging.getLogger(__name__)
 
-# Store the last known state
-last_device_state = None
+# Snapshot version seen by the previous poll in this worker process
+last_seen_version = None
+
+# Event journal of this worker process, opened by its first poll
+journal = None
+detector_ready = False
+
+# Seconds after which a queued poll is discarded instead of run late; the
+# next scheduled poll sees the same devices, so a stale one is only overhead
+POLL_EXPIRES = 2
 
 @shared_task(
-    bind=True,
-    soft_time_limit=30,  # 30 second timeout
-    max_retries=3,       # Retry up to 3 times
-    rate_limit='5',
-    ignore_result=True   # Prevents task results from being stored and logged
+    soft_time_limit=30,     # 30 second timeout
+    time_limit=35,          # Kill the scan if it ignores the soft limit
+    expires=POLL_EXPIRES,   # Drop polls that waited in the queue too long
+    acks_late=False,        # A lost poll is replaced by the next one, never redeliver
+    ignore_result=True      # Prevents task results from being stored and logged
 )
-def poll_for_devices(self):
+def poll_for_devices():
     """
     Celery task to poll for connected devices once.
-    This will be scheduled to run periodically.
+    This will be scheduled to run periodically and routed to the
+    device_polling queue (see CELERY_TASK_ROUTES).
     """
-    global last_device_state
+    global last_seen_version
     
     try:
+        prepare_detector()
         devices = DeviceDetector.scan_devices()
+        snapshot = DeviceDetector.get_snapshot()
+        EventStatsExporter.maybe_export('celery')
         
         # Only log if there's a change in devices
-        if devices != last_device_state:
-            # Uncommented logging to properly track device changes
-            if last_device_state is None:
+        if snapshot.version != last_seen_version:
+            if last_seen_version is None:
                 logger.info(f"Initial device scan completed. Found {len(devices)} Apple devices.")
             else:
-                old_count = len(last_device_state) if last_device_state else 0
-                new_count = len(devices)
-                if new_count > old_count:
-                    logger.info(f"New device(s) detected. Total devices: {new_count}")
-                elif new_count < old_count:
-                    logger.info(f"Device(s) disconnected. Total devices: {new_count}")
-                else:
+                changes = DeviceDetector.changes_since(last_seen_version)
+                if changes.added:
+                    logger.info(f"New device(s) detected. Total devices: {len(devices)}")
+                if changes.removed:
+                    logger.info(f"Device(s) disconnected. Total devices: {len(devices)}")
+                if changes.changed:
                     logger.info("Device configuration changed")
             
-            last_device_state = devices
+            last_seen_version = snapshot.version
             
         # Return summary instead of the full list
         return {
             'success': True,
             'devices_found': len(devices),
+            'version': snapshot.version,
         }
     except SoftTimeLimitExceeded:
+        # Not retried: the next scheduled poll scans again anyway
         logger.warning("Device polling task exceeded time limit")
-        raise self.retry(countdown=60)  # Retry after 1 minute
+        return {
+            'success': False,
+            'error': 'time limit exceeded'
+        }
     except Exception as e:
         # Log all errors
         logger.error(f"Error in device polling task: {str(e)}")
         return {
             'success': False,
             'error': str(e)
-        } 
\ No newline at end of file
+        } 
+
+def prepare_detector():
+    """Restore the detector before the first scan of a worker process
+
+    Done on the first poll rather than at process start because only the
+    process that polls may own the journal: every worker (and every pool
+    process replacing one killed by the time limit) starts the same way, but
+    polls are routed to the polling worker alone.
+    """
+    global journal, detector_ready
+    if detector_ready:
+        return
+    from .registry import DeviceRegistry
+
+    journal_dir = getattr(settings, 'DEVICE_EVENT_JOURNAL_DIR', None)
+    if journal_dir and journal is None:
+        journal = DeviceDetector.open_journal(journal_dir)
+    DeviceRegistry.reconcile(DeviceDetector.get_snapshot().devices)
+    detector_ready = True
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def close_journal(**kwargs):
+    """Flush the journal when the pool process (or a solo worker) exits"""
+    global journal
+    if journal is not None:
+        DeviceDetector.close_journal(journal)
+        journal = None
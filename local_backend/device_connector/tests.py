@@ -1,3 +1,518 @@
-from django.test import TestCase
+import io
+import logging
+import os
+import pickle
+import queue
+import subprocess
+import sys
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.tenancy import invalidate_tenant_cache
+
+from . import debounce
+from .debounce import DeviceDebouncer
+from .device_detection import APPLE_VENDOR_ID, SUPPORTED_PRODUCT_IDS, DeviceDetector
+from .device_record import DeviceRecord
+from .device_state import DeviceStateStore
+from .event_stats import EventStatsExporter
+from .models import Device
+from .sharding import ShardCoordinator, ShardSpec, run_shard_worker
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Upper bound for the summed self import time of a detector process start, in microseconds
+DETECTOR_IMPORT_BUDGET_US = 750_000
+
+DETECTOR_STARTUP = (
+    'import django; django.setup(); '
+    'from django.core.management import load_command_class; '
+    'load_command_class("device_connector", "poll_devices")'
+)
+
+
+def profile_imports(settings_module, code=DETECTOR_STARTUP):
+    """Run ``code`` under ``-X importtime`` and return (total self time in us, module names)"""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=BASE_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    total, modules = 0, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, module = line[len('import time:'):].split('|')
+        total += int(self_us)
+        modules.add(module.strip())
+    return total, modules
+
+
+class DetectorStartupTests(SimpleTestCase):
+    """Import-time budget for the lean detector entry point"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.total_us, cls.modules = profile_imports('core.settings_detector')
+
+    def test_import_time_within_budget(self):
+        self.assertLess(
+            self.total_us, DETECTOR_IMPORT_BUDGET_US,
+            f'Detector startup imports took {self.total_us / 1000:.0f}ms'
+        )
+
+    def test_skips_unneeded_packages(self):
+        for package in ('celery', 'kombu', 'usb', 'django.contrib.admin', 'django.contrib.sessions'):
+            loaded = sorted(m for m in self.modules if m == package or m.startswith(package + '.'))
+            self.assertEqual(loaded, [], f'{package} is imported at detector startup')
+
+
+def device_json(device_id, port_location, name='iPhone'):
+    return {'manufacturer': 'Apple Inc.', 'name': name, 'device_id': device_id, 'port_location': port_location}
+
+
+class ShardCoordinatorTests(SimpleTestCase):
+    """Ownership, migration and grace-period rules of the sharded detector"""
+
+    def setUp(self):
+        self.coordinator = ShardCoordinator(migration_grace=2.0)
+
+    def owner(self, device_id):
+        return self.coordinator.owners[device_id][0]
+
+    def test_reported_devices_are_merged(self):
+        self.coordinator.apply_report(0, 1.0, [device_json('a', 'b1_p1')])
+        self.coordinator.apply_report(1, 1.0, [device_json('b', 'b2_p1')])
+        merged = self.coordinator.merged()
+        self.assertEqual(sorted(merged), ['a', 'b'])
+        self.assertEqual(merged['b'].port_location, 'b2_p1')
+
+    def test_newer_report_from_other_shard_migrates_device(self):
+        self.coordinator.apply_report(0, 1.0, [device_json('a', 'b1_p1')])
+        self.coordinator.apply_report(1, 2.0, [device_json('a', 'b2_p3')])
+        self.assertEqual(self.owner('a'), 1)
+        self.assertEqual(self.coordinator.merged()['a'].port_location, 'b2_p3')
+
+    def test_stale_report_from_other_shard_is_ignored(self):
+        self.coordinator.apply_report(0, 5.0, [device_json('a', 'b1_p1')])
+        self.coordinator.apply_report(1, 3.0, [device_json('a', 'b2_p3')])
+        self.assertEqual(self.owner('a'), 0)
+        self.assertEqual(self.coordinator.merged()['a'].port_location, 'b1_p1')
+
+    def test_released_device_can_be_claimed_by_older_report(self):
+        self.coordinator.apply_report(0, 5.0, [device_json('a', 'b1_p1')])
+        self.coordinator.apply_report(0, 6.0, [])
+        # Shard 1 scanned before shard 0 let go, but shard 0 no longer claims it
+        self.coordinator.apply_report(1, 4.0, [device_json('a', 'b2_p3')])
+        self.assertEqual(self.owner('a'), 1)
+        self.assertNotIn('a', self.coordinator.released)
+
+    def test_released_device_is_kept_for_the_grace_period(self):
+        self.coordinator.apply_report(0, 1.0, [device_json('a', 'b1_p1')])
+        self.coordinator.apply_report(0, 2.0, [])
+        self.coordinator.expire(3.9)
+        self.assertIn('a', self.coordinator.merged())
+        self.coordinator.expire(4.0)
+        self.assertNotIn('a', self.coordinator.merged())
+        self.assertEqual(self.coordinator.released, {})
+
+    def test_grace_period_starts_at_first_missing_report(self):
+        self.coordinator.apply_report(0, 1.0, [device_json('a', 'b1_p1')])
+        self.coordinator.apply_report(0, 2.0, [])
+        self.coordinator.apply_report(0, 3.0, [])
+        self.assertEqual(self.coordinator.released, {'a': 2.0})
+
+    def test_device_reported_again_within_grace_is_not_released(self):
+        self.coordinator.apply_report(0, 1.0, [device_json('a', 'b1_p1')])
+        self.coordinator.apply_report(0, 2.0, [])
+        self.coordinator.apply_report(0, 3.0, [device_json('a', 'b1_p1')])
+        self.coordinator.expire(10.0)
+        self.assertIn('a', self.coordinator.merged())
+
+    def test_report_only_releases_devices_of_its_own_shard(self):
+        self.coordinator.apply_report(0, 1.0, [device_json('a', 'b1_p1')])
+        self.coordinator.apply_report(1, 1.0, [device_json('b', 'b2_p1')])
+        self.coordinator.apply_report(1, 2.0, [])
+        self.assertEqual(self.coordinator.released, {'b': 2.0})
+
+    def test_dropped_shard_releases_its_devices(self):
+        self.coordinator.apply_report(0, 1.0, [device_json('a', 'b1_p1'), device_json('b', 'b1_p2')])
+        self.coordinator.apply_report(1, 1.0, [device_json('c', 'b2_p1')])
+        self.coordinator.drop_shard(0, 5.0)
+        self.assertEqual(self.coordinator.released, {'a': 5.0, 'b': 5.0})
+        self.coordinator.expire(7.0)
+        self.assertEqual(sorted(self.coordinator.merged()), ['c'])
+
+
+def record(device_id, port_location='b1_p1'):
+    return DeviceRecord('Apple Inc.', 'iPhone', device_id, port_location)
+
+
+class DeviceDebouncerTests(SimpleTestCase):
+    """State machine of DeviceDebouncer, driven with explicit timestamps"""
+
+    def setUp(self):
+        self.debouncer = DeviceDebouncer(settle_time=2.0)
+
+    def connect(self, *records, now=0.0):
+        """Feed the records until their connection is reported"""
+        devices = {r.device_id: r for r in records}
+        self.debouncer.update(devices, now=now)
+        return self.debouncer.update(devices, now=now + self.debouncer.settle_time)
+
+    def test_connection_reported_after_settle_time(self):
+        a = record('a')
+        devices = {'a': a}
+        self.assertEqual(self.debouncer.update(devices, now=0.0), ([], []))
+        self.assertEqual(self.debouncer.state_of('a'), debounce.PENDING)
+        # Same mapping object, but a device is pending so it is still evaluated
+        self.assertEqual(self.debouncer.update(devices, now=1.9), ([], []))
+        self.assertEqual(self.debouncer.update(devices, now=2.0), ([a], []))
+        self.assertEqual(self.debouncer.state_of('a'), debounce.CONNECTED)
+        self.assertEqual(self.debouncer.announced(), {'a': a})
+
+    def test_disconnection_reported_after_settle_time(self):
+        a = record('a')
+        self.connect(a)
+        self.assertEqual(self.debouncer.update({}, now=10.0), ([], []))
+        self.assertEqual(self.debouncer.state_of('a'), debounce.PENDING_DISCONNECT)
+        self.assertEqual(self.debouncer.announced(), {'a': a})
+        self.assertEqual(self.debouncer.update({}, now=12.0), ([], [a]))
+        self.assertEqual(self.debouncer.state_of('a'), debounce.GONE)
+        self.assertEqual(self.debouncer.announced(), {})
+
+    def test_device_gone_while_pending_is_a_suppressed_flap(self):
+        self.debouncer.update({'a': record('a', 'b1_p3')}, now=0.0)
+        self.assertEqual(self.debouncer.update({}, now=1.0), ([], []))
+        self.assertEqual(self.debouncer.state_of('a'), debounce.GONE)
+        self.assertEqual(self.debouncer.suppressed_flaps, {'b1_p3': 1})
+
+    def test_device_back_while_pending_disconnect_is_a_suppressed_flap(self):
+        a = record('a', 'b1_p3')
+        self.connect(a)
+        self.debouncer.update({}, now=10.0)
+        self.assertEqual(self.debouncer.update({'a': a}, now=11.0), ([], []))
+        self.assertEqual(self.debouncer.state_of('a'), debounce.CONNECTED)
+        # The disconnect timer was cancelled, so nothing is reported later either
+        self.assertEqual(self.debouncer.update({'a': a}, now=20.0), ([], []))
+        self.assertEqual(self.debouncer.suppressed_flaps, {'b1_p3': 1})
+
+    def test_flaps_are_counted_per_port(self):
+        for now in (0.0, 2.0, 4.0):
+            self.debouncer.update({'a': record('a', 'b1_p1')}, now=now)
+            self.debouncer.update({}, now=now + 1.0)
+        self.debouncer.update({'b': record('b', 'b1_p2')}, now=10.0)
+        self.debouncer.update({}, now=10.5)
+        self.assertEqual(self.debouncer.suppressed_flaps, {'b1_p1': 3, 'b1_p2': 1})
+
+    def test_disconnect_reports_latest_record(self):
+        self.connect(record('a', 'b1_p1'))
+        moved = record('a', 'b2_p1')
+        self.debouncer.update({'a': moved}, now=5.0)
+        self.debouncer.update({}, now=6.0)
+        self.assertEqual(self.debouncer.update({}, now=8.0), ([], [moved]))
+
+    def test_seeded_devices_are_connected_without_events(self):
+        a, b = record('a'), record('b', 'b1_p2')
+        self.debouncer.seed({'a': a, 'b': b}, now=0.0)
+        self.assertEqual(self.debouncer.announced(), {'a': a, 'b': b})
+        self.assertEqual(self.debouncer.update({'a': a, 'b': b}, now=1.0), ([], []))
+        # A seeded device that is gone is reported once the disconnect settles
+        self.debouncer.update({'a': a}, now=2.0)
+        self.assertEqual(self.debouncer.update({'a': a}, now=4.0), ([], [b]))
+
+    def test_same_mapping_without_pending_devices_is_skipped(self):
+        a = record('a')
+        devices = {'a': a}
+        self.debouncer.update(devices, now=0.0)
+        self.debouncer.update(devices, now=2.0)
+        self.assertEqual(self.debouncer.update(devices, now=100.0), ([], []))
+        self.assertIs(self.debouncer._last_devices, devices)
+        # An equal but new mapping is evaluated and changes nothing either
+        self.assertEqual(self.debouncer.update({'a': a}, now=101.0), ([], []))
+        self.assertEqual(self.debouncer.state_of('a'), debounce.CONNECTED)
+
+    def test_zero_settle_time_reports_immediately(self):
+        self.debouncer.settle_time = 0
+        a = record('a')
+        self.assertEqual(self.debouncer.update({'a': a}, now=0.0), ([a], []))
+        self.assertEqual(self.debouncer.update({}, now=0.0), ([], [a]))
+        self.assertEqual(self.debouncer.suppressed_flaps, {})
+
+    def test_reset_forgets_devices_and_flaps(self):
+        self.connect(record('a'))
+        self.debouncer.update({'b': record('b')}, now=5.0)
+        self.debouncer.update({}, now=5.5)
+        self.debouncer.reset()
+        self.assertEqual(self.debouncer.announced(), {})
+        self.assertEqual(self.debouncer.suppressed_flaps, {})
+        self.assertEqual(self.debouncer.update({}, now=6.0), ([], []))
+
+
+@override_settings(EVENT_STATS_EXPORT_SECONDS=5)
+class EventStatsExporterTests(SimpleTestCase):
+    """Throttling of the subscriber stats export"""
+
+    def setUp(self):
+        patcher = mock.patch.object(EventStatsExporter, '_next_export', 0.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_exports_once_per_interval(self):
+        with mock.patch.object(EventStatsExporter, 'export') as export, \
+                mock.patch('device_connector.event_stats.time.monotonic', side_effect=[100.0, 103.0, 105.0]):
+            for _ in range(3):
+                EventStatsExporter.maybe_export('celery')
+        self.assertEqual(export.call_count, 2)
+
+    def test_export_errors_are_logged(self):
+        with mock.patch.object(EventStatsExporter, 'export', side_effect=RuntimeError('database is locked')):
+            with self.assertLogs('device_connector.event_stats', 'ERROR'):
+                EventStatsExporter.maybe_export('celery')
+
+
+class BenchmarkTenantListsTests(TestCase):
+    """The documented benchmark command keeps running"""
+
+    def test_runs_and_rolls_back(self):
+        out = io.StringIO()
+        call_command('benchmark_tenant_lists', tenants='1,2', rows_per_tenant=2, repeat=1, stdout=out)
+        output = out.getvalue()
+        for endpoint in ('device_list', 'connected_devices', 'device_info_list'):
+            self.assertIn(endpoint, output)
+        self.assertFalse(Device.objects.filter(tenant_id__startswith='bench-').exists())
+
+
+class TenantIsolationTests(TestCase):
+    """Device lists only show the requesting tenant's rows and follow writes immediately"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        Device.objects.create(tenant_id='a', manufacturer='Apple Inc.', name='a1', port_location='b1_p1', device_id='a1')
+        Device.objects.create(tenant_id='b', manufacturer='Apple Inc.', name='b1', port_location='b1_p2', device_id='b1')
+        Device.objects.create(tenant_id='default', manufacturer='Apple Inc.', name='d1', port_location='b1_p3', device_id='d1')
+
+    def device_names(self, path='/api/devices/', **extra):
+        response = self.client.get(path, **extra)
+        self.assertEqual(response.status_code, 200)
+        # The list layout has no device_id, so the tests name each device after it
+        return sorted(device['name'] for device in response.json()['devices'])
+
+    def test_lists_are_scoped_to_the_tenant(self):
+        self.assertEqual(self.device_names(HTTP_X_TENANT_ID='a'), ['a1'])
+        self.assertEqual(self.device_names(HTTP_X_TENANT_ID='b'), ['b1'])
+        self.assertEqual(self.device_names('/api/devices/connected/', HTTP_X_TENANT_ID='a'), ['a1'])
+        self.assertEqual(self.device_names('/api/devices/?tenant=b'), ['b1'])
+
+    def test_missing_or_blank_tenant_falls_back_to_default(self):
+        self.assertEqual(self.device_names(), ['d1'])
+        self.assertEqual(self.device_names(HTTP_X_TENANT_ID='   '), ['d1'])
+
+    def test_saves_and_deletes_invalidate_the_cached_list(self):
+        self.assertEqual(self.device_names(HTTP_X_TENANT_ID='a'), ['a1'])
+        self.assertEqual(self.device_names(HTTP_X_TENANT_ID='b'), ['b1'])
+        with mock.patch('core.tenancy.invalidate_tenant_cache', wraps=invalidate_tenant_cache) as invalidate:
+            device = Device.objects.create(tenant_id='a', manufacturer='Apple Inc.', name='a2',
+                                           port_location='b2_p1', device_id='a2')
+            self.assertEqual(self.device_names(HTTP_X_TENANT_ID='a'), ['a1', 'a2'])
+
+            device.is_connected = False
+            device.save()
+            self.assertEqual(self.device_names('/api/devices/connected/', HTTP_X_TENANT_ID='a'), ['a1'])
+
+            device.delete()
+            self.assertEqual(self.device_names(HTTP_X_TENANT_ID='a'), ['a1'])
+        self.assertEqual(invalidate.call_args_list, [mock.call('a')] * 3)
+        # Other tenants keep their cached entries
+        with self.assertNumQueries(0):
+            self.assertEqual(self.device_names(HTTP_X_TENANT_ID='b'), ['b1'])
+
+
+class DeviceStateStoreTests(SimpleTestCase):
+    """Copy-on-write snapshots and net diffs between versions"""
+
+    def setUp(self):
+        self.store = DeviceStateStore(history_size=4)
+
+    def test_unchanged_devices_keep_the_snapshot(self):
+        devices = {'a': DeviceRecord('Apple Inc.', 'iPhone', 'a', 'b1_p1')}
+        first = self.store.swap(devices)
+        self.assertEqual((first.version, first.added), (1, (devices['a'],)))
+
+        # A fresh dict with the same (interned) records publishes nothing
+        self.assertIs(self.store.swap(dict(devices)), first)
+        self.assertEqual(self.store.version, 1)
+
+    def test_snapshots_are_not_affected_by_later_writes(self):
+        devices = {'a': DeviceRecord('Apple Inc.', 'iPhone', 'a', 'b1_p1')}
+        snapshot = self.store.swap(devices)
+        devices['b'] = DeviceRecord('Apple Inc.', 'iPad', 'b', 'b1_p2')
+        self.assertEqual(list(snapshot.devices), ['a'])
+        with self.assertRaises(TypeError):
+            snapshot.devices['c'] = devices['b']
+
+    def test_changes_since_are_net_over_several_versions(self):
+        a = DeviceRecord('Apple Inc.', 'iPhone', 'a', 'b1_p1')
+        b = DeviceRecord('Apple Inc.', 'iPad', 'b', 'b1_p2')
+        c = DeviceRecord('Apple Inc.', 'iPhone', 'c', 'b1_p3')
+        a_moved = DeviceRecord('Apple Inc.', 'iPhone', 'a', 'b2_p1')
+        self.store.swap({'a': a, 'b': b})
+        self.store.swap({'a': a, 'b': b, 'c': c})
+        self.store.swap({'a': a_moved, 'c': c})
+
+        changes = self.store.changes_since(1)
+        self.assertTrue(changes.complete)
+        self.assertEqual((changes.from_version, changes.to_version), (1, 3))
+        self.assertEqual(changes.added, {'c': c})
+        self.assertEqual(changes.removed, {'b': b})
+        self.assertEqual(changes.changed, {'a': a_moved})
+        self.assertFalse(self.store.changes_since(3).has_changes)
+
+    def test_reverted_changes_are_not_reported(self):
+        a = DeviceRecord('Apple Inc.', 'iPhone', 'a', 'b1_p1')
+        b = DeviceRecord('Apple Inc.', 'iPad', 'b', 'b1_p2')
+        self.store.swap({'a': a})
+        self.store.swap({'a': DeviceRecord('Apple Inc.', 'iPhone', 'a', 'b2_p1'), 'b': b})
+        self.store.swap({'a': a})
+
+        self.assertEqual(self.store.version, 3)
+        self.assertFalse(self.store.changes_since(1).has_changes)
+
+    def test_version_out_of_history_gets_a_full_diff(self):
+        records = [DeviceRecord('Apple Inc.', 'iPhone', f'd{n}', f'b1_p{n}') for n in range(6)]
+        for count in range(1, 7):
+            self.store.swap({record.device_id: record for record in records[:count]})
+
+        changes = self.store.changes_since(1)
+        self.assertFalse(changes.complete)
+        self.assertEqual(changes.added, {record.device_id: record for record in records})
+        self.assertEqual((changes.removed, changes.changed), ({}, {}))
+        self.assertTrue(self.store.changes_since(3).complete)
+        self.assertEqual(sorted(self.store.changes_since(3).added), ['d3', 'd4', 'd5'])
+
+
+class DeviceRecordTests(SimpleTestCase):
+    """Interned, immutable device records"""
+
+    def test_equal_fields_give_the_same_object(self):
+        record = DeviceRecord('Apple Inc.', 'iPhone', 'a', 'b1_p1')
+        self.assertIs(DeviceRecord('Apple Inc.', 'iPhone', 'a', 'b1_p1'), record)
+        self.assertIsNot(DeviceRecord('Apple Inc.', 'iPhone', 'a', 'b1_p2'), record)
+        self.assertNotEqual(DeviceRecord('Apple Inc.', 'iPhone', 'a', 'b1_p2'), record)
+
+    def test_json_round_trip(self):
+        record = DeviceRecord('Apple Inc.', 'iPad', 'a', 'b1_p1_p2')
+        data = record.to_json()
+        self.assertEqual(data, {'manufacturer': 'Apple Inc.', 'name': 'iPad', 'device_id': 'a', 'port_location': 'b1_p1_p2'})
+        self.assertEqual(DeviceRecord.from_json(data), record)
+        self.assertIs(DeviceRecord.from_json(data), record)
+        self.assertIs(pickle.loads(pickle.dumps(record)), record)
+
+    def test_hashable(self):
+        record = DeviceRecord('Apple Inc.', 'iPhone', 'a', 'b1_p1')
+        self.assertEqual(hash(record), hash(DeviceRecord.from_json(record.to_json())))
+        self.assertEqual(len({record, DeviceRecord('Apple Inc.', 'iPhone', 'a', 'b1_p1')}), 1)
+
+    def test_immutable(self):
+        record = DeviceRecord('Apple Inc.', 'iPhone', 'a', 'b1_p1')
+        with self.assertRaises(AttributeError):
+            record.port_location = 'b2_p1'
+        with self.assertRaises(AttributeError):
+            del record.name
+        with self.assertRaises(AttributeError):
+            record.extra = True
+        self.assertEqual(record.port_location, 'b1_p1')
+
+
+class FakeUSBDevice:
+    """Just enough of a pyusb device for enumerate_devices"""
+
+    def __init__(self, product_id, serial, bus=1, port_numbers=(1,), vendor_id=APPLE_VENDOR_ID, name='iPhone'):
+        self.idVendor = vendor_id
+        self.idProduct = product_id
+        self.bus = bus
+        self.address = 1
+        self.port_numbers = port_numbers
+        self.iManufacturer, self.iProduct, self.iSerialNumber = 1, 2, 3
+        self.strings = {1: 'Apple Inc.', 2: name, 3: serial}
+
+
+class EnumerateDevicesTests(SimpleTestCase):
+    """Selecting iPhones and iPads while libusb enumerates"""
+
+    def setUp(self):
+        patcher = mock.patch.object(DeviceDetector, 'product_ids', SUPPORTED_PRODUCT_IDS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.read = []
+
+    def enumerate(self, devices, **kwargs):
+        def find(find_all=False, idVendor=None, custom_match=None):
+            return [
+                device for device in devices
+                if device.idVendor == idVendor and (custom_match is None or custom_match(device))
+            ]
+
+        def get_string(device, index):
+            self.read.append(device.strings[3])
+            return device.strings[index]
+
+        with mock.patch('usb.core.find', side_effect=find), mock.patch('usb.util.get_string', side_effect=get_string):
+            return DeviceDetector.enumerate_devices(**kwargs)
+
+    def test_only_known_product_ids_are_read(self):
+        devices = [
+            FakeUSBDevice(0x12a8, 'iphone', port_numbers=(1,)),
+            FakeUSBDevice(0x12ab, 'ipad', port_numbers=(2, 4), name='iPad'),
+            FakeUSBDevice(0x1392, 'watch-charger', port_numbers=(3,)),
+            FakeUSBDevice(0x12a8, 'keyboard', vendor_id=0x046d, port_numbers=(5,)),
+        ]
+        found = self.enumerate(devices)
+
+        self.assertEqual(found, {
+            'iphone': DeviceRecord('Apple Inc.', 'iPhone', 'iphone', 'b1_p1'),
+            'ipad': DeviceRecord('Apple Inc.', 'iPad', 'ipad', 'b1_p2_4'),
+        })
+        # Rejected devices never get a string descriptor read
+        self.assertEqual(set(self.read), {'iphone', 'ipad'})
+
+    def test_extra_product_ids_are_merged(self):
+        devices = [FakeUSBDevice(0x12a8, 'iphone'), FakeUSBDevice(0x12ac, 'new-model', port_numbers=(2,))]
+        self.assertEqual(list(self.enumerate(devices)), ['iphone'])
+
+        DeviceDetector.configure_product_ids([0x12ac])
+        self.assertEqual(DeviceDetector.product_ids, SUPPORTED_PRODUCT_IDS | {0x12ac})
+        self.assertEqual(sorted(self.enumerate(devices)), ['iphone', 'new-model'])
+
+    def test_shard_and_explicit_product_ids(self):
+        devices = [FakeUSBDevice(0x12a8, 'bus1', bus=1), FakeUSBDevice(0x12a8, 'bus2', bus=2)]
+        self.assertEqual(list(self.enumerate(devices, shard=ShardSpec(0, buses=[2]))), ['bus2'])
+        self.assertEqual(self.enumerate(devices, product_ids=frozenset({0x12ab})), {})
+
+
+class ShardWorkerTests(SimpleTestCase):
+    """The scanning loop run in each shard process"""
+
+    def test_reports_scan_and_exits_cleanly_on_ctrl_c(self):
+        record = DeviceRecord('Apple Inc.', 'iPhone', 'a', 'b1_p1')
+        reports = queue.Queue()
+        stop_event = mock.Mock()
+        stop_event.is_set.return_value = False
+        stop_event.wait.side_effect = KeyboardInterrupt
+
+        with mock.patch.object(DeviceDetector, 'enumerate_devices', return_value={'a': record}), \
+                mock.patch('device_connector.sharding.logging.basicConfig') as basic_config, \
+                self.assertLogs('device_connector.sharding', 'INFO') as logs:
+            run_shard_worker(ShardSpec(0, buses=[1]), 1, reports, stop_event)
+
+        basic_config.assert_called_once()
+        self.assertEqual(basic_config.call_args.kwargs['level'], logging.INFO)
+        shard_index, _, devices = reports.get_nowait()
+        self.assertEqual((shard_index, devices), (0, [record.to_json()]))
+        self.assertIn('stopped by user', logs.output[-1])
@@ -7,4 +7,5 @@ urlpatterns = [
     path('devices/', views.device_list, name='device_list'),
     path('devices/connected/', views.connected_devices, name='connected_devices'),
     path('devices/scan/', views.scan_now, name='scan_now'),
+    path('events/subscribers/', views.event_subscribers, name='event_subscribers'),
 ] 
\ No newline at end of file
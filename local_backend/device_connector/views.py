@@ -1,36 +1,43 @@
 from django.shortcuts import render
 from django.http import JsonResponse
+from core.serialization import list_response
 from .models import Device
 from .device_detection import DeviceDetector
+from .event_stats import EventStatsExporter
+
+DEVICE_LIST_FIELDS = (
+    'id', 'manufacturer', 'name', 'port_location', 
+    'is_connected', 'first_connected', 'last_seen'
+)
+CONNECTED_DEVICE_FIELDS = (
+    'id', 'manufacturer', 'name', 'port_location', 
+    'first_connected', 'last_seen'
+)
 
 def device_list(request):
-    """Return a list of all devices as JSON"""
-    devices = Device.objects.all().values(
-        'id', 'manufacturer', 'name', 'port_location', 
-        'is_connected', 'first_connected', 'last_seen'
+    """Return a list of all devices of the request's tenant as JSON, columnar JSON or MessagePack"""
+    tenant_id = request.tenant
+    return list_response(
+        request, tenant_id, 'device_list', 'devices', DEVICE_LIST_FIELDS,
+        lambda: Device.objects.for_tenant(tenant_id).values(*DEVICE_LIST_FIELDS)
     )
-    return JsonResponse({'devices': list(devices)})
 
 def connected_devices(request):
-    """Return a list of currently connected devices as JSON"""
-    devices = Device.objects.filter(is_connected=True).values(
-        'id', 'manufacturer', 'name', 'port_location', 
-        'first_connected', 'last_seen'
+    """Return a list of the tenant's currently connected devices as JSON, columnar JSON or MessagePack"""
+    tenant_id = request.tenant
+    return list_response(
+        request, tenant_id, 'connected_devices', 'devices', CONNECTED_DEVICE_FIELDS,
+        lambda: Device.objects.for_tenant(tenant_id).filter(is_connected=True).values(*CONNECTED_DEVICE_FIELDS)
     )
-    return JsonResponse({'devices': list(devices)})
 
 def scan_now(request):
     """Trigger an immediate device scan and return results"""
     devices = DeviceDetector.scan_devices()
-    device_data = [
-        {
-            'id': device.id,
-            'manufacturer': device.manufacturer,
-            'name': device.name,
-            'port_location': device.port_location,
-            'first_connected': device.first_connected,
-            'last_seen': device.last_seen
-        }
-        for device in devices
-    ]
-    return JsonResponse({'devices': device_data})
+    return JsonResponse({'devices': [device.to_json() for device in devices]})
+
+def event_subscribers(request):
+    """Return the subscriber stats exported by each process that publishes device events
+
+    This process doesn't publish them, so its own counters would read zero.
+    """
+    return JsonResponse({'publishers': EventStatsExporter.load()})
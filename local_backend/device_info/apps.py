@@ -8,7 +8,14 @@ class DeviceInfoConfig(AppConfig):
     def ready(self):
         """Initialize the app and register event handlers"""
         # Import here to avoid circular imports
+        from core.tenancy import register_tenant_cache_invalidation
+        from .lookups import load_lookups
         from .services import DeviceInfoService
         
+        # Build the model and region lookup tables once per process
+        load_lookups()
+        
+        register_tenant_cache_invalidation(self.get_model('DeviceInfo'))
+        
         # Initialize the device info service
         DeviceInfoService.initialize()
@@ -0,0 +1,154 @@
+import json
+import logging
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOOKUPS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'device_lookups.json')
+
+# Seconds between checks of the data file for changes unless settings say otherwise
+DEFAULT_RELOAD_CHECK_SECONDS = 5
+
+
+class DeviceLookups:
+    """Immutable index for decoding device identifiers into readable values
+
+    Built once from the bundled data file; every lookup is a dict access.
+    """
+
+    __slots__ = ('product_types', 'regions', 'colors', 'storage_options', 'product_types_by_family',
+                 'source', 'source_mtime')
+
+    def __init__(self, data: dict, source: Optional[str] = None, source_mtime: Optional[int] = None):
+        self.product_types: Mapping[str, Mapping[str, str]] = MappingProxyType({
+            product_type: MappingProxyType(dict(model))
+            for product_type, model in data.get('product_types', {}).items()
+        })
+        self.regions: Mapping[str, str] = MappingProxyType(dict(data.get('regions', {})))
+        self.colors = tuple(data.get('colors', ()))
+        self.storage_options = tuple(data.get('storage_options', ()))
+
+        by_family = {}
+        for product_type, model in self.product_types.items():
+            by_family.setdefault(model.get('family'), []).append(product_type)
+        self.product_types_by_family = MappingProxyType({
+            family: tuple(product_types) for family, product_types in by_family.items()
+        })
+        self.source = source
+        self.source_mtime = source_mtime
+
+    def model(self, product_type: Optional[str]) -> Optional[Mapping[str, str]]:
+        """Return ``family``, ``model_name`` and ``model_number`` for a ProductType"""
+        if not product_type:
+            return None
+        return self.product_types.get(product_type)
+
+    def region_name(self, region_info: Optional[str]) -> Optional[str]:
+        """Return the readable region for a RegionInfo value such as ``LL/A``"""
+        if not region_info:
+            return None
+        return self.regions.get(region_info.split('/', 1)[0])
+
+    def denormalize(self, info: dict) -> dict:
+        """Fill the readable fields derived from ``product_type`` and ``region_info``
+
+        Values already present are kept, so data reported by the device wins.
+        """
+        model = self.model(info.get('product_type'))
+        if model is not None:
+            info.setdefault('model_name', model['model_name'])
+            info.setdefault('model_number', model['model_number'])
+        if not info.get('region_info_human_readable'):
+            region = self.region_name(info.get('region_info'))
+            if region is not None:
+                info['region_info_human_readable'] = region
+        return info
+
+
+_lookups: Optional[DeviceLookups] = None
+_load_lock = threading.Lock()
+
+# time.monotonic() value after which get_lookups() next checks the data file
+_next_check = 0.0
+
+
+def lookups_path() -> str:
+    return getattr(settings, 'DEVICE_LOOKUPS_PATH', None) or DEFAULT_LOOKUPS_PATH
+
+
+def load_lookups(path: Optional[str] = None) -> DeviceLookups:
+    """Build the lookup index from a data file and make it the active one
+
+    The new index replaces the old one with a single reference swap, so
+    readers never see a partially loaded table.
+    """
+    global _lookups
+    path = path or lookups_path()
+    # Taken before reading, so a write racing the load is picked up by the next check
+    mtime = _file_mtime(path)
+    with open(path, encoding='utf-8') as f:
+        lookups = DeviceLookups(json.load(f), source=path, source_mtime=mtime)
+    _lookups = lookups
+    logger.info(
+        f"Loaded device lookups from {path}: {len(lookups.product_types)} product types, "
+        f"{len(lookups.regions)} regions"
+    )
+    return lookups
+
+
+def get_lookups() -> DeviceLookups:
+    """Return the active lookup index, loading it on first use
+
+    Every ``DEVICE_LOOKUPS_RELOAD_SECONDS`` the data file's modification time
+    is checked, and the index is reloaded when the file was edited, so a
+    running process picks up new models without a restart.
+    """
+    lookups = _lookups
+    if lookups is None:
+        with _load_lock:
+            lookups = _lookups or load_lookups()
+    elif time.monotonic() >= _next_check:
+        lookups = _reload_if_changed(lookups)
+    return lookups
+
+
+def _file_mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _reload_if_changed(lookups: DeviceLookups) -> DeviceLookups:
+    global _next_check
+    interval = getattr(settings, 'DEVICE_LOOKUPS_RELOAD_SECONDS', DEFAULT_RELOAD_CHECK_SECONDS)
+    # While disabled, keep re-reading the setting so it can be switched on in tests
+    _next_check = time.monotonic() + (interval or DEFAULT_RELOAD_CHECK_SECONDS)
+    if not interval:
+        return lookups
+    if lookups.source == lookups_path() and _file_mtime(lookups.source) == lookups.source_mtime:
+        return lookups
+    return reload_lookups() or lookups
+
+
+def reload_lookups() -> Optional[DeviceLookups]:
+    """Re-read the data file, keeping the old index on errors"""
+    try:
+        return load_lookups()
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to reload device lookups from {lookups_path()}: {str(e)}")
+        return None
+
+
+@receiver(setting_changed)
+def _reload_on_setting_change(setting, **kwargs):
+    if setting == 'DEVICE_LOOKUPS_PATH':
+        reload_lookups()
@@ -0,0 +1,107 @@
+import gzip
+import json
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from core import middleware, serialization
+from device_info.lookups import get_lookups
+from device_info.views import DEVICE_INFO_LIST_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Benchmark bytes on the wire and serialization time of the device info list layouts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=10000,
+            help='Device info rows to serialize'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Serializations per layout, the median is reported'
+        )
+
+    def handle(self, *args, **options):
+        rows = self._rows(options['rows'])
+        repeat = options['repeat']
+        fields = DEVICE_INFO_LIST_FIELDS
+
+        encoders = [
+            # What JsonResponse({'devices': rows}) produced before content negotiation
+            ('json (before)', lambda: json.dumps({'devices': rows}, cls=DjangoJSONEncoder).encode()),
+        ]
+        for layout in serialization.available_formats():
+            encoders.append((layout, lambda layout=layout: serialization.encode_rows('devices', rows, fields, layout)))
+
+        self.stdout.write(
+            f'{len(rows)} rows\n'
+            f'{"layout":<14} {"encode ms":>10} {"bytes":>10} {"gzip":>10} {"gzip ms":>8} {"brotli":>10} {"br ms":>8}'
+        )
+        for name, encode in encoders:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                body = encode()
+                timings.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            gzipped = len(gzip.compress(body, compresslevel=middleware.GZIP_LEVEL, mtime=0))
+            gzip_ms = (time.perf_counter() - started) * 1000
+            if middleware.brotli is not None:
+                started = time.perf_counter()
+                brotli_size = str(len(middleware.brotli.compress(body, quality=middleware.BROTLI_QUALITY)))
+                brotli_ms = f'{(time.perf_counter() - started) * 1000:.1f}'
+            else:
+                brotli_size = brotli_ms = '-'
+
+            self.stdout.write(
+                f'{name:<14} {statistics.median(timings) * 1000:>10.1f} {len(body):>10} '
+                f'{gzipped:>10} {gzip_ms:>8.1f} {brotli_size:>10} {brotli_ms:>8}'
+            )
+        if serialization.msgpack is None:
+            self.stdout.write('msgpack is not installed, MessagePack was skipped')
+        if middleware.brotli is None:
+            self.stdout.write('brotli is not installed, brotli compression was skipped')
+
+    def _rows(self, count):
+        """Synthetic rows shaped like the device info list"""
+        lookups = get_lookups()
+        now = timezone.now()
+        product_types = ['iPhone14,2', 'iPhone15,3', 'iPhone13,1', 'iPad13,4', 'iPhone12,8']
+        regions = ['LL/A', 'B/A', 'ZP/A', 'J/A', 'CH/A']
+        rows = []
+        for index in range(count):
+            product_type = product_types[index % len(product_types)]
+            region = regions[index % len(regions)]
+            storage_total = 128 * 1024 ** 3
+            storage_used = (index * 7919 % 100) * storage_total // 100
+            rows.append({
+                'device_id': f'00008101-{index:016X}',
+                'imei': f'35{index:013d}',
+                'serial_number': f'F{index:011X}',
+                'product_type': product_type,
+                'model_number': f'M{index % 900 + 100}',
+                'region_info': region,
+                'region_info_human_readable': lookups.region_name(region),
+                'ios_version': f'17.{index % 6}',
+                'model_name': (lookups.model(product_type) or {}).get('model_name', product_type),
+                'storage_capacity': '128 GB',
+                'activation_state': 'Activated' if index % 10 else 'Unactivated',
+                'findmy_status': 'Off' if index % 3 else 'On',
+                'housing_color': 'Space Black',
+                'battery_level': index % 100,
+                'storage_total': storage_total,
+                'storage_used': storage_used,
+                'last_updated': now - timedelta(seconds=index, microseconds=index),
+                'storage_percentage': round(storage_used / storage_total * 100, 1),
+            })
+        return rows
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.tenancy import station_tenant_id
+from device_connector.models import Device
+from device_info.models import DeviceInfo
+from device_info.services import DeviceInfoService
+
+class Command(BaseCommand):
+    help = 'Re-collect device info for many devices at once'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'device_ids',
+            nargs='*',
+            help='Device ids to refresh'
+        )
+        parser.add_argument(
+            '--connected',
+            action='store_true',
+            help='Refresh every connected device of the tenant'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Refresh every device that already has device info'
+        )
+        parser.add_argument(
+            '--tenant',
+            default=None,
+            help='Tenant to refresh (default: the station tenant)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Devices written per batch'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Devices queried concurrently'
+        )
+
+    def handle(self, *args, **options):
+        tenant_id = options['tenant'] or station_tenant_id()
+        device_ids = list(options['device_ids'])
+        if options['connected']:
+            # Maintained by DeviceRegistry from the connection events
+            device_ids += Device.objects.for_tenant(tenant_id).filter(is_connected=True).values_list('device_id', flat=True)
+        if options['all']:
+            device_ids += DeviceInfo.objects.for_tenant(tenant_id).values_list('device_id', flat=True)
+        if not device_ids:
+            raise CommandError('No devices to refresh, pass device ids, --connected or --all')
+
+        result = DeviceInfoService.bulk_collect_device_info(
+            device_ids,
+            tenant_id=tenant_id,
+            batch_size=options['batch_size'],
+            max_workers=options['workers'],
+        )
+
+        for device_id, error in result.outcomes.items():
+            if error is None:
+                self.stdout.write(f'{device_id}: ok')
+            else:
+                self.stdout.write(self.style.ERROR(f'{device_id}: {error}'))
+
+        summary = (
+            f'Refreshed {len(result.succeeded)}/{len(result.outcomes)} devices '
+            f'({result.created} created, {result.updated} updated) in {result.elapsed:.2f}s, '
+            f'{result.throughput:.1f} devices/s, {result.db_queries} DB round trips'
+        )
+        self.stdout.write(self.style.SUCCESS(summary) if not result.failed else self.style.WARNING(summary))
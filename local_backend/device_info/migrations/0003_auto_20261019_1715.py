@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('device_info', '0002_auto_20250413_1435'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deviceinfo',
+            name='tenant_id',
+            field=models.CharField(default='default', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='deviceinfo',
+            name='device_id',
+            field=models.CharField(max_length=255),
+        ),
+        migrations.AddConstraint(
+            model_name='deviceinfo',
+            constraint=models.UniqueConstraint(fields=('tenant_id', 'device_id'), name='deviceinfo_unique_per_tenant'),
+        ),
+    ]
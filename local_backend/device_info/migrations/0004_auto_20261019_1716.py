@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('device_info', '0003_auto_20261019_1715'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FleetStatBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tenant_id', models.CharField(default='default', max_length=255)),
+                ('dimension', models.CharField(max_length=50)),
+                ('value', models.CharField(blank=True, default='', max_length=255)),
+                ('count', models.BigIntegerField(default=0)),
+                ('total', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='fleetstatbucket',
+            constraint=models.UniqueConstraint(fields=('tenant_id', 'dimension', 'value'), name='fleetstat_unique_bucket'),
+        ),
+    ]
@@ -1,11 +1,15 @@
 from django.db import models
 from django.utils import timezone
+from core.tenancy import DEFAULT_TENANT_ID, TenantManager
 
 class DeviceInfo(models.Model):
     """Stores additional information about devices"""
     
+    # Owning tenant, device_id is only unique within it
+    tenant_id = models.CharField(max_length=255, default=DEFAULT_TENANT_ID)
+    
     # Device identifier (matches device_id in device_connector)
-    device_id = models.CharField(max_length=255, unique=True)
+    device_id = models.CharField(max_length=255)
     
     # Additional device information
     imei = models.CharField(max_length=50, blank=True, null=True)
@@ -28,6 +32,13 @@ class DeviceInfo(models.Model):
     storage_used = models.BigIntegerField(blank=True, null=True)   # in bytes
     last_updated = models.DateTimeField(default=timezone.now)
     
+    objects = TenantManager()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tenant_id', 'device_id'], name='deviceinfo_unique_per_tenant'),
+        ]
+    
     def __str__(self):
         return f"DeviceInfo for {self.device_id} ({self.model_name or self.product_type or 'Unknown model'})"
     
@@ -37,3 +48,28 @@ class DeviceInfo(models.Model):
         if self.storage_total and self.storage_used:
             return round((self.storage_used / self.storage_total) * 100, 1)
         return None
+
+
+class FleetStatBucket(models.Model):
+    """Incrementally maintained fleet aggregate for one dimension value
+    
+    ``count`` is the number of devices in the bucket; ``total`` accumulates a
+    numeric field (e.g. battery level) so averages can be derived without
+    scanning DeviceInfo.
+    """
+    
+    tenant_id = models.CharField(max_length=255, default=DEFAULT_TENANT_ID)
+    dimension = models.CharField(max_length=50)
+    value = models.CharField(max_length=255, blank=True, default='')
+    count = models.BigIntegerField(default=0)
+    total = models.BigIntegerField(default=0)
+    
+    objects = TenantManager()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tenant_id', 'dimension', 'value'], name='fleetstat_unique_bucket'),
+        ]
+    
+    def __str__(self):
+        return f"{self.tenant_id} {self.dimension}={self.value!r}: {self.count}"
@@ -1,12 +1,57 @@
 import logging
 import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection, transaction
 from django.utils import timezone
 from core.events import EventSystem
+from core.tenancy import invalidate_tenant_cache, station_tenant_id
 from device_connector.device_detection import DEVICE_CONNECTED, DEVICE_DISCONNECTED
+from .lookups import get_lookups
 from .models import DeviceInfo
+from .stats import TRACKED_FIELDS, FleetStatsService
 
 logger = logging.getLogger(__name__)
 
+# DeviceInfo fields written by a bulk refresh
+REFRESHED_FIELDS = [
+    'product_type', 'model_name', 'model_number', 'region_info', 'region_info_human_readable',
+    'imei', 'serial_number', 'ios_version', 'activation_state', 'findmy_status',
+    'housing_color', 'storage_capacity', 'model_identifier', 'battery_level',
+    'storage_total', 'storage_used', 'last_updated',
+]
+
+# Celery task that collects a newly connected device's info, routed to the
+# device_info queue by CELERY_TASK_ROUTES
+COLLECT_DEVICE_INFO_TASK = 'device_info.tasks.collect_device_info'
+
+# Region codes handed out by the sample data generator
+SAMPLE_REGION_INFO = ['LL/A', 'ZA/A', 'FD/A']
+
+class BulkRefreshResult:
+    """Outcome of a bulk device info refresh"""
+    
+    def __init__(self):
+        # device_id -> None on success, or the error message
+        self.outcomes = {}
+        self.created = 0
+        self.updated = 0
+        self.db_queries = 0
+        self.elapsed = 0.0
+    
+    @property
+    def succeeded(self):
+        return [device_id for device_id, error in self.outcomes.items() if error is None]
+    
+    @property
+    def failed(self):
+        return {device_id: error for device_id, error in self.outcomes.items() if error is not None}
+    
+    @property
+    def throughput(self):
+        """Devices refreshed per second"""
+        return len(self.succeeded) / self.elapsed if self.elapsed else 0.0
+
 class DeviceInfoService:
     """Service for collecting and managing additional device information"""
     
@@ -19,11 +64,23 @@ class DeviceInfoService:
     
     @classmethod
     def handle_device_connected(cls, device_info):
-        """Handle a device connected event"""
+        """Handle a device connected event
+        
+        Events are published by the process that polls for devices, so
+        querying the device here would hold up the next scan. Collection is
+        queued for the device_info workers instead (see CELERY_TASK_ROUTES).
+        """
         logger.info(f"DeviceInfoService: Processing newly connected device {device_info['device_id']}")
         
-        # Collect additional information for this device
-        cls.collect_device_info(device_info)
+        # Imported on first use so the lean detector doesn't load Celery at startup
+        from core.celery import app
+        
+        try:
+            app.send_task(COLLECT_DEVICE_INFO_TASK, args=[device_info], ignore_result=True)
+        except Exception as e:
+            # Without a broker, collect in this process rather than miss the device
+            logger.error(f"Could not queue device info collection for {device_info['device_id']}: {str(e)}")
+            cls.collect_device_info(device_info)
     
     @classmethod
     def handle_device_disconnected(cls, device_info):
@@ -32,89 +89,75 @@ class DeviceInfoService:
         # We could mark the device info as stale or do other cleanup here
     
     @classmethod
-    def collect_device_info(cls, device_info):
-        """Collect additional information about a device
+    def query_device(cls, device_info):
+        """Query a device for its additional information
         
         In a real implementation, this would run commands to query the device.
         For this example, we'll just generate some sample data.
         """
+        # For demonstration, we'll use random sample data
+        # In a real implementation, you would run commands to query the device
+        
+        # Determine if it's an iPhone or iPad based on the device name
+        is_iphone = 'iPhone' in device_info['name']
+        device_type = 'iPhone' if is_iphone else 'iPad'
+        
+        # Model, region, colour and storage tables are loaded once at startup
+        lookups = get_lookups()
+        
+        # Select a random model of the right family
+        product_type = random.choice(lookups.product_types_by_family[device_type])
+        
+        # Generate sample device info
+        sample_info = {
+            'product_type': product_type,
+            'region_info': random.choice(SAMPLE_REGION_INFO),
+            
+            # Generate other fields
+            'imei': ''.join([str(random.randint(0, 9)) for _ in range(15)]),
+            'serial_number': ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', k=12)),
+            'ios_version': f"17.{random.randint(0, 7)}.{random.randint(0, 3)}",
+            'activation_state': random.choice(['Activated', 'Unactivated']),
+            'findmy_status': random.choice(['on', 'off']),
+            'housing_color': random.choice(lookups.colors),
+            'storage_capacity': random.choice(lookups.storage_options),
+            
+            # Legacy fields
+            'model_identifier': product_type,  # For backward compatibility
+            'battery_level': random.randint(10, 100),
+            'storage_total': int(int(random.choice(lookups.storage_options[1:-1]).replace('GB', '')) * 1024 * 1024 * 1024),  # Convert GB to bytes
+            'storage_used': random.randint(20, 110) * 1024 * 1024 * 1024,  # 20-110GB in bytes
+        }
+        
+        # Store the readable model and region names alongside the raw codes
+        lookups.denormalize(sample_info)
+        
+        return sample_info
+    
+    @classmethod
+    def collect_device_info(cls, device_info):
+        """Collect additional information about a device and store it"""
         device_id = device_info['device_id']
         logger.info(f"Collecting additional info for device {device_id}")
         
         try:
-            # For demonstration, we'll use random sample data
-            # In a real implementation, you would run commands to query the device
-            
-            # Determine if it's an iPhone or iPad based on the device name
-            is_iphone = 'iPhone' in device_info['name']
-            device_type = 'iPhone' if is_iphone else 'iPad'
-            
-            # iPhone model options
-            iphone_models = [
-                {'product_type': 'iPhone14,3', 'model_name': 'iPhone 13 Pro Max', 'model_number': 'MLH63'},
-                {'product_type': 'iPhone15,3', 'model_name': 'iPhone 14 Pro Max', 'model_number': 'MQ8V3'},
-                {'product_type': 'iPhone16,2', 'model_name': 'iPhone 15 Pro Max', 'model_number': 'MU2A3'},
-            ]
-            
-            # iPad model options
-            ipad_models = [
-                {'product_type': 'iPad13,1', 'model_name': 'iPad Air (4th gen)', 'model_number': 'MYGW2'},
-                {'product_type': 'iPad14,5', 'model_name': 'iPad Pro 12.9-inch (5th gen)', 'model_number': 'MHNF3'},
-                {'product_type': 'iPad15,2', 'model_name': 'iPad Pro 11-inch (4th gen)', 'model_number': 'MNXD3'},
-            ]
+            sample_info = cls.query_device(device_info)
             
-            # Select random model data based on device type
-            model_data = random.choice(iphone_models if is_iphone else ipad_models)
-            
-            # Region info options
-            region_info_options = [
-                {'region_info': 'LL/A', 'region_info_human_readable': 'United States and Canada'},
-                {'region_info': 'ZA/A', 'region_info_human_readable': 'Hong Kong, Macao, and Taiwan'},
-                {'region_info': 'FD/A', 'region_info_human_readable': 'Switzerland and Liechtenstein'},
-            ]
-            region_data = random.choice(region_info_options)
-            
-            # Color options
-            colors = ['Space Gray', 'Silver', 'Gold', 'Pacific Blue', 'Graphite', 'Sierra Blue', 'Deep Purple']
-            
-            # Storage options
-            storage_options = ['64GB', '128GB', '256GB', '512GB', '1TB']
-            
-            # Generate sample device info
-            sample_info = {
-                # Use the model data selected above
-                'product_type': model_data['product_type'],
-                'model_name': model_data['model_name'],
-                'model_number': model_data['model_number'],
-                
-                # Region info
-                'region_info': region_data['region_info'],
-                'region_info_human_readable': region_data['region_info_human_readable'],
-                
-                # Generate other fields
-                'imei': ''.join([str(random.randint(0, 9)) for _ in range(15)]),
-                'serial_number': ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', k=12)),
-                'ios_version': f"17.{random.randint(0, 7)}.{random.randint(0, 3)}",
-                'activation_state': random.choice(['Activated', 'Unactivated']),
-                'findmy_status': random.choice(['on', 'off']),
-                'housing_color': random.choice(colors),
-                'storage_capacity': random.choice(storage_options),
-                
-                # Legacy fields
-                'model_identifier': model_data['product_type'],  # For backward compatibility
-                'battery_level': random.randint(10, 100),
-                'storage_total': int(int(random.choice(storage_options[1:-1]).replace('GB', '')) * 1024 * 1024 * 1024),  # Convert GB to bytes
-                'storage_used': random.randint(20, 110) * 1024 * 1024 * 1024,  # 20-110GB in bytes
-            }
-            
-            # Update or create device info record
-            device_info_obj, created = DeviceInfo.objects.update_or_create(
-                device_id=device_id,
-                defaults={
-                    **sample_info,
-                    'last_updated': timezone.now()
-                }
-            )
+            # Update or create device info record, keeping the fleet aggregates in step
+            tenant_id = station_tenant_id()
+            with transaction.atomic():
+                old_values = DeviceInfo.objects.for_tenant(tenant_id).filter(
+                    device_id=device_id
+                ).values(*TRACKED_FIELDS).first()
+                device_info_obj, created = DeviceInfo.objects.update_or_create(
+                    tenant_id=tenant_id,
+                    device_id=device_id,
+                    defaults={
+                        **sample_info,
+                        'last_updated': timezone.now()
+                    }
+                )
+                FleetStatsService.apply_changes(tenant_id, [(old_values, sample_info)])
             
             logger.info(f"{'Created' if created else 'Updated'} device info for {device_id}: {sample_info}")
             
@@ -122,4 +165,105 @@ class DeviceInfoService:
             
         except Exception as e:
             logger.error(f"Error collecting device info for {device_id}: {str(e)}")
-            return None 
\ No newline at end of file
+            return None
+    
+    @classmethod
+    def bulk_collect_device_info(cls, device_ids, tenant_id=None, batch_size=100, max_workers=8):
+        """Collect and store info for many devices at once
+        
+        Devices are queried concurrently, then each batch is written with one
+        SELECT of the existing rows, one bulk INSERT and one bulk UPDATE
+        instead of a SELECT plus a write per device.
+        """
+        tenant_id = tenant_id or station_tenant_id()
+        result = BulkRefreshResult()
+        device_ids = list(dict.fromkeys(device_ids))
+        
+        def count_query(execute, sql, params, many, context):
+            result.db_queries += 1
+            return execute(sql, params, many, context)
+        
+        start = time.perf_counter()
+        with connection.execute_wrapper(count_query), ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for offset in range(0, len(device_ids), batch_size):
+                batch = device_ids[offset:offset + batch_size]
+                known = cls._resolve_devices(tenant_id, batch)
+                for device_id in batch:
+                    if device_id not in known:
+                        result.outcomes[device_id] = 'Unknown device'
+                
+                queried = {}
+                futures = {device_id: executor.submit(cls.query_device, device_info) for device_id, device_info in known.items()}
+                for device_id, future in futures.items():
+                    try:
+                        queried[device_id] = future.result()
+                    except Exception as e:
+                        logger.error(f"Error collecting device info for {device_id}: {str(e)}")
+                        result.outcomes[device_id] = str(e)
+                
+                if queried:
+                    cls._store_batch(tenant_id, queried, result)
+        result.elapsed = time.perf_counter() - start
+        
+        logger.info(
+            f"Bulk refreshed {len(result.succeeded)}/{len(device_ids)} devices in {result.elapsed:.2f}s "
+            f"({result.throughput:.1f} devices/s, {result.db_queries} queries)"
+        )
+        return result
+    
+    @classmethod
+    def _resolve_devices(cls, tenant_id, device_ids):
+        """Return the connection details needed to query each known device
+        
+        Read from the Device table, which DeviceRegistry keeps current from
+        any process; the detector's in-memory snapshot is empty outside the
+        process that scans.
+        """
+        from device_connector.models import Device
+        
+        known = {
+            device['device_id']: device
+            for device in Device.objects.for_tenant(tenant_id).filter(device_id__in=device_ids).values(
+                'device_id', 'manufacturer', 'name', 'port_location')
+        }
+        missing = [device_id for device_id in device_ids if device_id not in known]
+        if missing:
+            # Fall back to the last collected product type to tell iPhones from iPads
+            for device_id, product_type in DeviceInfo.objects.for_tenant(tenant_id).filter(
+                    device_id__in=missing).values_list('device_id', 'product_type'):
+                if product_type:
+                    known[device_id] = {'device_id': device_id, 'name': product_type}
+        return known
+    
+    @classmethod
+    def _store_batch(cls, tenant_id, queried, result):
+        now = timezone.now()
+        with transaction.atomic():
+            existing = {
+                row['device_id']: row
+                for row in DeviceInfo.objects.for_tenant(tenant_id).filter(
+                    device_id__in=list(queried)
+                ).values('id', 'device_id', *TRACKED_FIELDS)
+            }
+            to_create, to_update, changes = [], [], []
+            for device_id, info in queried.items():
+                row = existing.get(device_id)
+                obj = DeviceInfo(tenant_id=tenant_id, device_id=device_id, last_updated=now, **info)
+                if row is None:
+                    to_create.append(obj)
+                else:
+                    obj.pk = row.pop('id')
+                    row.pop('device_id')
+                    to_update.append(obj)
+                changes.append((row, info))
+            
+            DeviceInfo.objects.bulk_create(to_create)
+            DeviceInfo.objects.bulk_update(to_update, REFRESHED_FIELDS)
+            FleetStatsService.apply_changes(tenant_id, changes)
+        # Bulk writes don't send post_save, so drop the tenant's cached lists here
+        invalidate_tenant_cache(tenant_id)
+        
+        result.created += len(to_create)
+        result.updated += len(to_update)
+        for device_id in queried:
+            result.outcomes[device_id] = None
@@ -0,0 +1,169 @@
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from core.tenancy import get_tenant_cached, invalidate_tenant_cache
+from .models import DeviceInfo, FleetStatBucket
+
+logger = logging.getLogger(__name__)
+
+# DeviceInfo fields counted per distinct value
+COUNTED_DIMENSIONS = ('model_name', 'ios_version', 'activation_state', 'findmy_status')
+
+# Buckets that aren't keyed by a field value
+DEVICES = 'devices'
+BATTERY = 'battery_level'
+
+# Values needed from a DeviceInfo row to compute its bucket deltas
+TRACKED_FIELDS = COUNTED_DIMENSIONS + (BATTERY,)
+
+# Every dimension stored in FleetStatBucket
+DIMENSIONS = (DEVICES, BATTERY) + COUNTED_DIMENSIONS
+
+BucketKey = Tuple[str, str]
+
+
+class FleetStatsService:
+    """Maintains fleet-wide aggregates so dashboards don't scan DeviceInfo
+
+    Every DeviceInfo write passes the row's tracked values before and after
+    the write to ``apply_changes``, which turns them into per-bucket deltas.
+    ``recompute`` rebuilds the buckets from scratch and is run periodically to
+    repair any drift. The connected device count isn't a bucket: it is
+    counted from ``Device.is_connected``, which ``DeviceRegistry`` maintains.
+    """
+
+    @classmethod
+    def apply_changes(cls, tenant_id: str, changes: Iterable[Tuple[Optional[dict], Optional[dict]]]) -> None:
+        """Apply ``(old, new)`` DeviceInfo value pairs to the tenant's buckets
+
+        ``old`` is None for inserts and ``new`` is None for deletes.
+        """
+        deltas: Dict[BucketKey, list] = defaultdict(lambda: [0, 0])
+        for old, new in changes:
+            cls._accumulate(deltas, old, -1)
+            cls._accumulate(deltas, new, 1)
+        cls._apply_deltas(tenant_id, deltas)
+
+    @staticmethod
+    def _accumulate(deltas, values, sign):
+        if values is None:
+            return
+        deltas[(DEVICES, '')][0] += sign
+        for dimension in COUNTED_DIMENSIONS:
+            deltas[(dimension, values.get(dimension) or '')][0] += sign
+        battery = values.get(BATTERY)
+        if battery is not None:
+            bucket = deltas[(BATTERY, '')]
+            bucket[0] += sign
+            bucket[1] += sign * battery
+
+    @classmethod
+    def _apply_deltas(cls, tenant_id, deltas) -> None:
+        deltas = {key: delta for key, delta in deltas.items() if delta[0] or delta[1]}
+        if not deltas:
+            return
+
+        with transaction.atomic():
+            # One SELECT, one bulk UPDATE and one bulk INSERT however many buckets move
+            existing = {
+                (bucket.dimension, bucket.value): bucket
+                for bucket in FleetStatBucket.objects.for_tenant(tenant_id).filter(
+                    dimension__in={dimension for dimension, _ in deltas}
+                ).only('id', 'dimension', 'value')
+            }
+            to_update, to_create = [], []
+            for key, (count, total) in deltas.items():
+                bucket = existing.get(key)
+                if bucket is None:
+                    to_create.append(FleetStatBucket(
+                        tenant_id=tenant_id, dimension=key[0], value=key[1], count=count, total=total
+                    ))
+                else:
+                    bucket.count = F('count') + count
+                    bucket.total = F('total') + total
+                    to_update.append(bucket)
+
+            FleetStatBucket.objects.bulk_update(to_update, ['count', 'total'])
+            try:
+                with transaction.atomic():
+                    FleetStatBucket.objects.bulk_create(to_create)
+            except IntegrityError:
+                # Some buckets were created concurrently, add to them one by one
+                for bucket in to_create:
+                    cls._add_to_bucket(tenant_id, bucket.dimension, bucket.value, bucket.count, bucket.total)
+        invalidate_tenant_cache(tenant_id)
+
+    @staticmethod
+    def _add_to_bucket(tenant_id, dimension, value, count, total) -> None:
+        bucket = FleetStatBucket.objects.filter(tenant_id=tenant_id, dimension=dimension, value=value)
+        if not bucket.update(count=F('count') + count, total=F('total') + total):
+            FleetStatBucket.objects.create(
+                tenant_id=tenant_id, dimension=dimension, value=value, count=count, total=total
+            )
+
+    @classmethod
+    def recompute(cls, tenant_id: Optional[str] = None) -> int:
+        """Rebuild buckets from DeviceInfo for one tenant, or all when omitted
+
+        Returns the number of tenants recomputed.
+        """
+        if tenant_id is None:
+            tenant_ids = set(DeviceInfo.objects.values_list('tenant_id', flat=True).distinct())
+            tenant_ids |= set(FleetStatBucket.objects.values_list('tenant_id', flat=True).distinct())
+        else:
+            tenant_ids = {tenant_id}
+
+        for tenant in tenant_ids:
+            rows = DeviceInfo.objects.for_tenant(tenant)
+            buckets = []
+            for dimension in COUNTED_DIMENSIONS:
+                for entry in rows.values(dimension).annotate(n=Count('id')).order_by():
+                    buckets.append(FleetStatBucket(
+                        tenant_id=tenant, dimension=dimension, value=entry[dimension] or '', count=entry['n']
+                    ))
+            totals = rows.aggregate(devices=Count('id'), battery_count=Count(BATTERY), battery_total=Sum(BATTERY))
+            buckets.append(FleetStatBucket(tenant_id=tenant, dimension=DEVICES, count=totals['devices']))
+            buckets.append(FleetStatBucket(
+                tenant_id=tenant, dimension=BATTERY,
+                count=totals['battery_count'], total=totals['battery_total'] or 0
+            ))
+
+            with transaction.atomic():
+                FleetStatBucket.objects.for_tenant(tenant).delete()
+                FleetStatBucket.objects.bulk_create(buckets)
+            invalidate_tenant_cache(tenant)
+
+        logger.info(f"Recomputed fleet statistics for {len(tenant_ids)} tenant(s)")
+        return len(tenant_ids)
+
+    @classmethod
+    def get_stats(cls, tenant_id: str) -> dict:
+        """Return the tenant's summary, cached until its data changes"""
+        return get_tenant_cached(tenant_id, 'fleet_stats', lambda: cls._build_stats(tenant_id))
+
+    @staticmethod
+    def _build_stats(tenant_id: str) -> dict:
+        from device_connector.models import Device
+
+        stats = {
+            'total_devices': 0,
+            # Uses the (tenant_id, is_connected) index
+            'connected_devices': Device.objects.for_tenant(tenant_id).filter(is_connected=True).count(),
+            'average_battery': None,
+        }
+        for dimension in COUNTED_DIMENSIONS:
+            stats[f'by_{dimension}'] = {}
+
+        for dimension, value, count, total in FleetStatBucket.objects.for_tenant(tenant_id).filter(
+                dimension__in=DIMENSIONS).values_list('dimension', 'value', 'count', 'total'):
+            if dimension == DEVICES:
+                stats['total_devices'] = count
+            elif dimension == BATTERY:
+                stats['average_battery'] = round(total / count, 1) if count else None
+            elif count > 0:
+                stats[f'by_{dimension}'][value or 'Unknown'] = count
+        return stats
@@ -0,0 +1,28 @@
+import logging
+from celery import shared_task
+from .services import DeviceInfoService
+from .stats import FleetStatsService
+
+logger = logging.getLogger(__name__)
+
+@shared_task(ignore_result=True)
+def collect_device_info(device_info):
+    """
+    Celery task that queries a newly connected device and stores its info.
+    Queued by DeviceInfoService.handle_device_connected and routed to the
+    device_info queue, so slow device queries never delay polling.
+    """
+    DeviceInfoService.collect_device_info(device_info)
+
+@shared_task(ignore_result=True)
+def recompute_fleet_stats():
+    """
+    Celery task that rebuilds the fleet aggregates from DeviceInfo.
+    Scheduled periodically to correct any drift in the incremental counters.
+    """
+    try:
+        tenants = FleetStatsService.recompute()
+        return {'success': True, 'tenants': tenants}
+    except Exception as e:
+        logger.error(f"Error recomputing fleet statistics: {str(e)}")
+        return {'success': False, 'error': str(e)}
@@ -1,3 +1,267 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.celery import app as celery_app
+from device_connector.models import Device
+
+from . import lookups
+from .models import DeviceInfo, FleetStatBucket
+from .services import COLLECT_DEVICE_INFO_TASK, DeviceInfoService
+from .stats import TRACKED_FIELDS, FleetStatsService
+from .tasks import collect_device_info
+
+
+def lookup_data(model_name):
+    return {
+        'product_types': {'iPhone99,1': {'family': 'iPhone', 'model_name': model_name, 'model_number': 'M1'}},
+        'regions': {'LL': 'United States'},
+    }
+
+
+class LookupReloadTests(SimpleTestCase):
+    """Running processes pick up edits of the lookup data file"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'lookups.json')
+        self.write('iPhone 99')
+        settings_override = override_settings(DEVICE_LOOKUPS_PATH=self.path, DEVICE_LOOKUPS_RELOAD_SECONDS=5)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def write(self, model_name, mtime_offset=0):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(lookup_data(model_name), f)
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + mtime_offset))
+
+    def model_name(self):
+        return lookups.get_lookups().model('iPhone99,1')['model_name']
+
+    def test_edited_file_is_reloaded_on_next_check(self):
+        self.assertEqual(self.model_name(), 'iPhone 99')
+        self.write('iPhone 99 Pro', mtime_offset=10 ** 9)
+        lookups._next_check = 0.0
+        self.assertEqual(self.model_name(), 'iPhone 99 Pro')
+
+    def test_file_is_not_checked_before_interval(self):
+        lookups._next_check = 0.0
+        self.model_name()
+        self.write('iPhone 99 Pro', mtime_offset=10 ** 9)
+        self.assertEqual(self.model_name(), 'iPhone 99')
+
+    def test_unreadable_file_keeps_previous_index(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('{"product_types": ')
+        os.utime(self.path, ns=(0, os.stat(self.path).st_mtime_ns + 10 ** 9))
+        lookups._next_check = 0.0
+        with self.assertLogs('device_info.lookups', 'ERROR'):
+            self.assertEqual(self.model_name(), 'iPhone 99')
+
+
+class DeviceConnectedTests(SimpleTestCase):
+    """Collection of newly connected devices is queued, not run in the polling process"""
+
+    device = {'manufacturer': 'Apple Inc.', 'name': 'iPhone', 'device_id': 'a', 'port_location': 'b1_p1'}
+
+    def test_queues_collection(self):
+        with mock.patch.object(celery_app, 'send_task') as send_task, \
+                mock.patch.object(DeviceInfoService, 'collect_device_info') as collect:
+            DeviceInfoService.handle_device_connected(self.device)
+        send_task.assert_called_once_with(COLLECT_DEVICE_INFO_TASK, args=[self.device], ignore_result=True)
+        collect.assert_not_called()
+
+    def test_queued_task_is_registered_and_routed(self):
+        self.assertEqual(collect_device_info.name, COLLECT_DEVICE_INFO_TASK)
+        self.assertEqual(celery_app.amqp.router.route({}, COLLECT_DEVICE_INFO_TASK)['queue'].name, 'device_info')
+
+    def test_collects_inline_without_broker(self):
+        with mock.patch.object(celery_app, 'send_task', side_effect=ConnectionError('broker down')), \
+                mock.patch.object(DeviceInfoService, 'collect_device_info') as collect:
+            with self.assertLogs('device_info.services', 'ERROR'):
+                DeviceInfoService.handle_device_connected(self.device)
+        collect.assert_called_once_with(self.device)
+
+
+class DeviceInfoTenantTests(TestCase):
+    """Device info is only served to the tenant it belongs to"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        DeviceInfo.objects.create(tenant_id='a', device_id='a1', model_name='iPhone 14')
+        DeviceInfo.objects.create(tenant_id='b', device_id='b1', model_name='iPad Air')
+
+    def device_ids(self, **extra):
+        response = self.client.get('/api/device-info/', **extra)
+        self.assertEqual(response.status_code, 200)
+        return sorted(device['device_id'] for device in response.json()['devices'])
+
+    def test_list_is_scoped_to_the_tenant(self):
+        self.assertEqual(self.device_ids(HTTP_X_TENANT_ID='a'), ['a1'])
+        self.assertEqual(self.device_ids(HTTP_X_TENANT_ID='b'), ['b1'])
+        self.assertEqual(self.device_ids(), [])
+
+    def test_detail_of_another_tenant_is_not_found(self):
+        response = self.client.get('/api/device-info/a1/', HTTP_X_TENANT_ID='a')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['model_name'], 'iPhone 14')
+        self.assertEqual(self.client.get('/api/device-info/a1/', HTTP_X_TENANT_ID='b').status_code, 404)
+        self.assertEqual(self.client.get('/api/device-info/a1/').status_code, 404)
+
+    def test_writes_show_up_in_the_next_list(self):
+        self.assertEqual(self.device_ids(HTTP_X_TENANT_ID='a'), ['a1'])
+        info = DeviceInfo.objects.create(tenant_id='a', device_id='a2')
+        self.assertEqual(self.device_ids(HTTP_X_TENANT_ID='a'), ['a1', 'a2'])
+        info.delete()
+        self.assertEqual(self.device_ids(HTTP_X_TENANT_ID='a'), ['a1'])
+
+
+def sample_info(model_name='iPhone 14', ios_version='17.4.1', battery_level=80, **extra):
+    return {
+        'model_name': model_name, 'ios_version': ios_version, 'activation_state': 'Activated',
+        'findmy_status': 'Off', 'battery_level': battery_level, **extra,
+    }
+
+
+class FleetStatsTests(TestCase):
+    """Incremental fleet aggregates stay equal to a full recompute"""
+
+    tenant_id = 'default'
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def collect(self, device_id, info):
+        with mock.patch.object(DeviceInfoService, 'query_device', return_value=info):
+            self.assertIsNotNone(DeviceInfoService.collect_device_info({'device_id': device_id}))
+
+    def delete(self, device_id):
+        rows = DeviceInfo.objects.for_tenant(self.tenant_id).filter(device_id=device_id)
+        old = rows.values(*TRACKED_FIELDS).get()
+        rows.delete()
+        FleetStatsService.apply_changes(self.tenant_id, [(old, None)])
+
+    def assertMatchesRecompute(self):
+        incremental = FleetStatsService.get_stats(self.tenant_id)
+        # Recompute in a savepoint that is rolled back, so later steps keep
+        # building on the incrementally maintained buckets
+        with transaction.atomic():
+            FleetStatsService.recompute(self.tenant_id)
+            recomputed = FleetStatsService.get_stats(self.tenant_id)
+            transaction.set_rollback(True)
+        cache.clear()
+        self.assertEqual(incremental, recomputed)
+        return incremental
+
+    def test_inserts_updates_and_deletes_match_recompute(self):
+        self.collect('a', sample_info())
+        self.collect('b', sample_info('iPad Air', battery_level=60))
+        self.collect('c', sample_info(ios_version='16.0', battery_level=None))
+        stats = self.assertMatchesRecompute()
+        self.assertEqual(stats['total_devices'], 3)
+        self.assertEqual(stats['average_battery'], 70.0)
+        self.assertEqual(stats['by_model_name'], {'iPhone 14': 2, 'iPad Air': 1})
+
+        self.collect('a', sample_info('iPhone 15', battery_level=90))
+        self.collect('b', sample_info('iPad Air', battery_level=None))
+        self.collect('c', sample_info(ios_version='17.4.1', battery_level=20))
+        stats = self.assertMatchesRecompute()
+        self.assertEqual(stats['average_battery'], 55.0)
+        self.assertEqual(stats['by_ios_version'], {'17.4.1': 3})
+
+        self.delete('a')
+        self.delete('c')
+        stats = self.assertMatchesRecompute()
+        self.assertEqual(stats['total_devices'], 1)
+        self.assertIsNone(stats['average_battery'])
+        self.assertEqual(stats['by_model_name'], {'iPad Air': 1})
+
+    def test_bucket_created_concurrently_is_added_to(self):
+        bulk_update = FleetStatBucket.objects.bulk_update
+
+        def create_bucket_then_update(objs, fields):
+            # Another writer creates the bucket after this one looked for it
+            FleetStatBucket.objects.create(tenant_id=self.tenant_id, dimension='model_name', value='iPhone 14', count=2)
+            return bulk_update(objs, fields)
+
+        with mock.patch.object(FleetStatBucket.objects, 'bulk_update', side_effect=create_bucket_then_update):
+            FleetStatsService.apply_changes(self.tenant_id, [(None, sample_info())])
+
+        stats = FleetStatsService.get_stats(self.tenant_id)
+        self.assertEqual(stats['by_model_name'], {'iPhone 14': 3})
+        self.assertEqual(stats['total_devices'], 1)
+        self.assertEqual(stats['average_battery'], 80.0)
+
+    def test_stats_are_cached_until_the_buckets_change(self):
+        FleetStatsService.apply_changes(self.tenant_id, [(None, sample_info())])
+        self.assertEqual(FleetStatsService.get_stats(self.tenant_id)['total_devices'], 1)
+        with self.assertNumQueries(0):
+            FleetStatsService.get_stats(self.tenant_id)
+
+        FleetStatsService.apply_changes(self.tenant_id, [(None, sample_info())])
+        self.assertEqual(FleetStatsService.get_stats(self.tenant_id)['total_devices'], 2)
+
+
+class BulkCollectTests(TestCase):
+    """Batched device info refresh"""
+
+    tenant_id = 'default'
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def seed(self, new_ids, existing_ids, model_name='iPhone 13'):
+        for device_id in new_ids + existing_ids:
+            Device.objects.create(tenant_id=self.tenant_id, manufacturer='Apple Inc.', name='iPhone',
+                                  port_location='b1_p1', device_id=device_id)
+        for device_id in existing_ids:
+            DeviceInfo.objects.create(tenant_id=self.tenant_id, device_id=device_id, **sample_info(model_name))
+        FleetStatsService.recompute(self.tenant_id)
+
+    def refresh(self, device_ids, **kwargs):
+        def query_device(device_info):
+            if device_info['device_id'] == 'broken':
+                raise RuntimeError('Device not responding')
+            return sample_info(battery_level=len(device_info['device_id']))
+
+        with mock.patch.object(DeviceInfoService, 'query_device', side_effect=query_device):
+            return DeviceInfoService.bulk_collect_device_info(device_ids, tenant_id=self.tenant_id, max_workers=2, **kwargs)
+
+    def test_creates_new_updates_existing_and_reports_outcomes(self):
+        self.seed(['new1', 'new2', 'broken'], ['old1'])
+        with self.assertLogs('device_info.services', 'ERROR'):
+            result = self.refresh(['new1', 'old1', 'gone', 'new2', 'broken', 'new1'])
+
+        self.assertEqual((result.created, result.updated), (2, 1))
+        self.assertEqual(result.outcomes, {
+            'new1': None, 'new2': None, 'old1': None,
+            'gone': 'Unknown device', 'broken': 'Device not responding',
+        })
+        rows = dict(DeviceInfo.objects.for_tenant(self.tenant_id).values_list('device_id', 'model_name'))
+        self.assertEqual(rows, {'new1': 'iPhone 14', 'new2': 'iPhone 14', 'old1': 'iPhone 14'})
+        self.assertEqual(FleetStatsService.get_stats(self.tenant_id)['by_model_name'], {'iPhone 14': 3})
+
+    def test_batch_writes_in_a_constant_number_of_queries(self):
+        # Existing rows hold the reported values, so both refreshes touch the same buckets
+        self.seed(['s-new1', 's-new2'], ['s-old1', 's-old2'], model_name='iPhone 14')
+        with CaptureQueriesContext(connection) as small:
+            result = self.refresh(['s-new1', 's-new2', 's-old1', 's-old2', 's-gone'])
+        self.assertEqual(len(result.succeeded), 4)
+
+        self.seed([f'l-new{n}' for n in range(6)], [f'l-old{n}' for n in range(6)], model_name='iPhone 14')
+        device_ids = [f'l-new{n}' for n in range(6)] + [f'l-old{n}' for n in range(6)] + ['l-gone']
+        with self.assertNumQueries(len(small)):
+            result = self.refresh(device_ids)
+        self.assertEqual((result.created, result.updated), (6, 6))
+        self.assertEqual(result.db_queries, len(small))
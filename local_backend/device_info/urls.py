@@ -5,5 +5,6 @@ app_name = 'device_info'
 
 urlpatterns = [
     path('', views.device_info_list, name='device_info_list'),
+    path('stats/', views.device_info_stats, name='device_info_stats'),
     path('<str:device_id>/', views.device_info_detail, name='device_info_detail'),
 ] 
\ No newline at end of file
@@ -2,19 +2,34 @@ from django.shortcuts import render
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from django.views.decorators.http import require_http_methods
+from core.serialization import list_response
 from .models import DeviceInfo
+from .stats import FleetStatsService
 
 # Create your views here.
 
+DEVICE_INFO_QUERY_FIELDS = (
+    'device_id', 'imei', 'serial_number', 'product_type', 'model_number',
+    'region_info', 'region_info_human_readable', 'ios_version', 'model_name', 'storage_capacity',
+    'activation_state', 'findmy_status', 'housing_color',
+    'battery_level', 'storage_total', 'storage_used', 'last_updated'
+)
+DEVICE_INFO_LIST_FIELDS = DEVICE_INFO_QUERY_FIELDS + ('storage_percentage',)
+
 @require_http_methods(["GET"])
 def device_info_list(request):
-    """Return a list of all devices with their additional info"""
-    devices = list(DeviceInfo.objects.values(
-        'device_id', 'imei', 'serial_number', 'product_type', 'model_number',
-        'region_info', 'ios_version', 'model_name', 'storage_capacity',
-        'activation_state', 'findmy_status', 'housing_color',
-        'battery_level', 'storage_total', 'storage_used', 'last_updated'
-    ))
+    """Return a list of the tenant's devices with their additional info
+    
+    Served as JSON, columnar JSON or MessagePack depending on the request.
+    """
+    tenant_id = request.tenant
+    return list_response(
+        request, tenant_id, 'device_info_list', 'devices', DEVICE_INFO_LIST_FIELDS,
+        lambda: _build_device_info_list(tenant_id)
+    )
+
+def _build_device_info_list(tenant_id):
+    devices = list(DeviceInfo.objects.for_tenant(tenant_id).values(*DEVICE_INFO_QUERY_FIELDS))
     
     # Add calculated fields
     for device in devices:
@@ -23,12 +38,17 @@ def device_info_list(request):
         else:
             device['storage_percentage'] = None
     
-    return JsonResponse({'devices': devices})
+    return devices
+
+@require_http_methods(["GET"])
+def device_info_stats(request):
+    """Return fleet-wide aggregates for the tenant's devices"""
+    return JsonResponse(FleetStatsService.get_stats(request.tenant))
 
 @require_http_methods(["GET"])
 def device_info_detail(request, device_id):
     """Return detailed info for a specific device"""
-    device = get_object_or_404(DeviceInfo, device_id=device_id)
+    device = get_object_or_404(DeviceInfo.objects.for_tenant(request.tenant), device_id=device_id)
     
     data = {
         'device_id': device.device_id,
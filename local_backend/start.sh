@@ -9,8 +9,10 @@ python manage.py migrate > logs/migrations.log 2>&1
 echo "Starting Redis..."
 redis-server --daemonize yes > logs/redis.log 2>&1
 
-echo "Starting Celery worker..."
-celery -A core worker -l info --logfile=logs/celery.log --detach
+echo "Starting Celery workers..."
+# A single-process worker that only polls, so scans never wait behind collection work
+celery -A core worker -Q device_polling -c 1 -n polling@%h -l info --logfile=logs/celery_polling.log --detach
+celery -A core worker -Q device_info,celery -n worker@%h -l info --logfile=logs/celery.log --detach
 
 echo "Starting Celery beat..."
 celery -A core beat -l info --scheduler django_celery_beat.schedulers:DatabaseScheduler --logfile=logs/celery_beat.log --detach